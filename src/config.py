@@ -34,6 +34,10 @@ GOOGLE_DRIVE_MARKETBOT_FOLDER_ID = os.getenv("GOOGLE_DRIVE_MARKETBOT_FOLDER_ID")
 DRIVE_ENHANCED_IMAGES_SUBFOLDER = "Enhanced_Images"
 LOCAL_ENHANCED_IMAGES_PATH = "/root/myAI/MarketBot/enhanced_images"
 
+# Постоянный кеш результатов улучшения контента (SQLite)
+ENHANCEMENT_CACHE_PATH = os.getenv("ENHANCEMENT_CACHE_PATH", "/root/myAI/MarketBot/cache/enhancements.sqlite3")
+ENHANCEMENT_CACHE_SIZE_LIMIT_MB = int(os.getenv("ENHANCEMENT_CACHE_SIZE_LIMIT_MB", "5120"))
+
 # OAuth Settings
 USE_OAUTH_FOR_DRIVE = os.getenv("USE_OAUTH_FOR_DRIVE", "True").lower() == "true"
 GOOGLE_OAUTH_CREDENTIALS_FILE = os.getenv("GOOGLE_OAUTH_CREDENTIALS_FILE", "config/google_oauth_credentials.json")
@@ -8,6 +8,7 @@ import io
 import logging
 import base64
 import json
+import random
 from datetime import datetime
 from typing import Dict, Any, Optional, Tuple, List
 import httpx
@@ -25,6 +26,102 @@ def get_recognition_endpoint():
 def get_content_generation_endpoint():
     return f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_CONTENT_GENERATION_MODEL}:generateContent"
 
+# Категории фотосъемки: ключевые слова в названии товара
+_PHOTOGRAPHY_CATEGORY_KEYWORDS = (
+    ('glassware', ('бокал', 'стакан', 'ваза', 'посуд', 'тарелка', 'чашка', 'кружка', 'стекл')),
+    ('textile', ('ткань', 'текстиль', 'полотенце', 'постельное', 'одеяло', 'подушка', 'плед')),
+    ('electronics', ('электро', 'гаджет', 'провод', 'зарядка', 'устройство', 'техник')),
+)
+
+# Фотографические настройки для каждой категории
+_PHOTOGRAPHY_SETTINGS = {
+    'glassware': {
+        'scene_description': 'The glass/dishware item is positioned on a pristine white marble surface with subtle natural veining, creating an elegant foundation.',
+        'lens_type': 'macro lens (100mm equivalent)',
+        'camera_angle': 'slightly elevated 20-degree angle',
+        'composition_style': 'dynamic 5-degree tilt for visual energy',
+        'background_description': 'Bright, clean white background with subtle gradient to light gray at edges, suggesting modern kitchen environment. Soft natural window light aesthetic creating crystal-clear transparency and elegant reflections that showcase glass quality.',
+        'color_style': 'bright, high-contrast with enhanced clarity for glass transparency and reflections'
+    },
+    'textile': {
+        'scene_description': 'The textile product is artfully arranged on natural wooden surface, showcasing fabric texture, drape, and tactile quality.',
+        'lens_type': '85mm portrait lens',
+        'camera_angle': 'eye-level with slight 10-degree elevation',
+        'composition_style': 'gentle organic arrangement highlighting fabric flow and softness',
+        'background_description': 'Warm neutral background (light beige to soft gray) with natural wood texture accent. Soft diffused lighting mimicking natural daylight from window, creating gentle shadows that emphasize textile softness and weave detail.',
+        'color_style': 'warm, natural tones with emphasis on fabric texture detail and material quality'
+    },
+    'electronics': {
+        'scene_description': 'The electronic item is placed on sleek modern surface in minimalist tech-forward environment.',
+        'lens_type': 'standard 50mm lens with precise focus',
+        'camera_angle': 'straight-on eye-level for geometric precision',
+        'composition_style': 'perfectly centered alignment emphasizing clean lines and technical precision',
+        'background_description': 'Minimalist gradient background transitioning from pure white at center to light cool gray at edges. Tech-aesthetic lighting with subtle blue undertones suggesting precision, innovation, and modernity.',
+        'color_style': 'crisp, high-contrast with slight cool color temperature for modern tech aesthetic'
+    },
+    'universal': {
+        'scene_description': 'The product is positioned on clean professional surface in neutral studio environment.',
+        'lens_type': 'standard 50mm lens',
+        'camera_angle': 'slightly elevated 15-degree angle for optimal perspective',
+        'composition_style': 'centered with subtle asymmetric placement for visual interest',
+        'background_description': 'Clean professional white to light gray background with soft gradient. Studio lighting setup creating modern, fresh aesthetic suitable for any product category.',
+        'color_style': 'balanced, true-to-life colors with enhanced vibrancy'
+    },
+}
+
+def _build_image_prompt_template(settings: Dict[str, str]) -> str:
+    """Собрать шаблон промпта с подставленными настройками категории"""
+    return f"""You are a professional product photographer specializing in B2B wholesale e-commerce imagery for Russian marketplaces.
+
+PRODUCT INFORMATION:
+- Product: {{product_name}}
+{{material_line}}
+{{description_line}}
+
+PHOTOGRAPHY SCENE DESCRIPTION:
+Imagine a professional product photoshoot in a high-end studio environment. {settings['scene_description']} The setting conveys premium quality and reliability that B2B wholesale buyers expect from their suppliers.
+
+CAMERA SETUP:
+The product is captured using {settings['lens_type']} from {settings['camera_angle']}, positioned to showcase the product's key features, dimensions, and material quality. The composition follows {settings['composition_style']}, with the product occupying 70-80% of the frame as the hero element.
+
+LIGHTING DESIGN:
+Professional three-point lighting setup creates dimensional depth:
+- Main key light from large softbox positioned at 45-degree angle above-front, delivering soft directional illumination that reveals texture and form
+- Fill light at quarter intensity from opposite side, preventing harsh shadows while maintaining natural depth
+- Subtle rim light accentuating product edges and emphasizing {{material_texture}} texture
+- Natural-looking shadows falling at 30-degree angle, adding dimensionality without distraction
+- Gentle highlights and reflections that showcase craftsmanship and material quality
+
+BACKGROUND & ENVIRONMENT:
+{settings['background_description']}
+The composition is clean and distraction-free, with all extraneous objects, hands, watermarks, text, and graphic elements completely removed.
+
+VISUAL QUALITY & COLOR GRADING:
+- High-resolution macro-level detail revealing texture, weave, finish quality, and craftsmanship
+- Rich, vibrant {settings['color_style']}
+- Sharp focus throughout the product with subtle depth of field effect on background
+- Natural contrast that makes product stand out clearly against background
+- Authentic, non-over-processed aesthetic meeting 2025 e-commerce photography standards
+- Professional color accuracy for true-to-life product representation
+
+MARKETPLACE OPTIMIZATION:
+The final image must meet professional standards for major Russian B2B wholesale marketplaces (Ozon, Wildberries, AliExpress) and Telegram wholesale catalog channels. The photography should convey premium quality, inspire confidence in product reliability, and create desire for wholesale purchase.
+
+CRITICAL CONSTRAINTS:
+- Do NOT alter the product itself - ONLY enhance the presentation, lighting, and environment
+- Do NOT add watermarks, logos, text overlays, or any graphic elements
+- Do NOT change product colors, shape, or inherent characteristics
+- Preserve authentic product appearance while optimizing visual appeal through professional photography technique
+- Focus on creating trust and desire through lighting, composition, and background rather than artificial manipulation
+
+The goal is professional catalog photography that makes wholesale buyers want to touch, examine, and order this product in bulk quantity."""
+
+# Шаблоны промпта редактирования изображения, по одному на категорию
+_IMAGE_PROMPT_TEMPLATES = {
+    category_key: _build_image_prompt_template(settings)
+    for category_key, settings in _PHOTOGRAPHY_SETTINGS.items()
+}
+
 class ContentGenerationService:
     """Класс для генерации контента товаров"""
 
@@ -34,7 +131,12 @@ class ContentGenerationService:
         self.usage_limits = get_usage_limits(sheets_manager)
         self.api_key = GEMINI_API_KEY
         self.timeout = 60.0  # 60 секунд таймаут для генерации изображений
+        self.connect_timeout = 5.0  # Недоступный прокси/хост должен отваливаться быстро
         self.max_retries = 3
+        self._http_client = None  # Постоянный клиент, создается при первом вызове API
+        # Одновременных запросов к Gemini не больше этого числа: товары генерируются
+        # параллельно, и у каждого до трех запросов (изображение, описание, маркетинг)
+        self._request_semaphore = asyncio.Semaphore(8)
 
         # Настройки генерации текста
         self.text_generation_config = {
@@ -53,6 +155,27 @@ class ContentGenerationService:
 
         logger.info("Сервис генерации контента инициализирован с Gemini Vision HTTP API")
 
+    def _get_http_client(self, proxies: Dict[str, str]) -> httpx.AsyncClient:
+        """Постоянный HTTP клиент: соединения с Gemini API переиспользуются между вызовами (keep-alive)"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                proxies=proxies if proxies else None
+            )
+        return self._http_client
+
+    async def close(self):
+        """Закрыть HTTP клиент"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    @staticmethod
+    def _retry_delay(attempt: int) -> float:
+        """Экспоненциальная задержка перед повтором со случайной добавкой,
+        чтобы параллельные запросы не повторялись одновременно"""
+        return 2 ** attempt + random.random()
+
     async def call_gemini_api(self, text: str, image_bytes: Optional[bytes] = None, image_mime: Optional[str] = None, generation_config: Optional[Dict] = None, use_image_model: bool = False) -> Dict[str, Any]:
         """Вызов Gemini API через HTTP"""
         if generation_config is None:
@@ -107,11 +230,12 @@ class ContentGenerationService:
 
         last_error = None
 
-        async with httpx.AsyncClient(timeout=self.timeout, proxies=proxies if proxies else None) as client:
-            for attempt in range(self.max_retries):
-                try:
-                    logger.info(f"Попытка вызова Gemini API для генерации контента {attempt + 1}/{self.max_retries}")
+        client = self._get_http_client(proxies)
+        for attempt in range(self.max_retries):
+            try:
+                logger.info(f"Попытка вызова Gemini API для генерации контента {attempt + 1}/{self.max_retries}")
 
+                async with self._request_semaphore:
                     response = await client.post(
                         endpoint,
                         params=params,
@@ -119,38 +243,38 @@ class ContentGenerationService:
                         json=payload
                     )
 
-                    # Retry на 503 (service unavailable) или 429 (rate limit)
-                    if response.status_code in (503, 429):
-                        if attempt < self.max_retries - 1:
-                            wait_time = 2 ** attempt  # Exponential backoff
-                            logger.warning(f"Gemini API вернул {response.status_code} при генерации. Повторная попытка через {wait_time}с (попытка {attempt + 1}/{self.max_retries})")
-                            await asyncio.sleep(wait_time)
-                            continue
-                        else:
-                            response.raise_for_status()
-
-                    response.raise_for_status()
-                    return response.json()
-
-                except httpx.HTTPStatusError as e:
-                    last_error = e
-                    # Retry на 503 или 429 если есть попытки
-                    if e.response.status_code in (503, 429) and attempt < self.max_retries - 1:
-                        wait_time = 2 ** attempt
-                        error_text = e.response.text[:200] if e.response.text else "No response text"
-                        logger.warning(f"Gemini API ошибка {e.response.status_code} при генерации: {error_text}. Повтор через {wait_time}с (попытка {attempt + 1}/{self.max_retries})")
-                        await asyncio.sleep(wait_time)
-                        continue
-                    raise
-
-                except Exception as e:
-                    last_error = e
+                # Retry на 503 (service unavailable) или 429 (rate limit)
+                if response.status_code in (503, 429):
                     if attempt < self.max_retries - 1:
-                        wait_time = 2 ** attempt
-                        logger.warning(f"Gemini API исключение при генерации: {type(e).__name__}: {str(e)}. Повтор через {wait_time}с (попытка {attempt + 1}/{self.max_retries})")
+                        wait_time = self._retry_delay(attempt)
+                        logger.warning(f"Gemini API вернул {response.status_code} при генерации. Повторная попытка через {wait_time:.1f}с (попытка {attempt + 1}/{self.max_retries})")
                         await asyncio.sleep(wait_time)
                         continue
-                    raise
+                    else:
+                        response.raise_for_status()
+
+                response.raise_for_status()
+                return response.json()
+
+            except httpx.HTTPStatusError as e:
+                last_error = e
+                # Retry на 503 или 429 если есть попытки
+                if e.response.status_code in (503, 429) and attempt < self.max_retries - 1:
+                    wait_time = self._retry_delay(attempt)
+                    error_text = e.response.text[:200] if e.response.text else "No response text"
+                    logger.warning(f"Gemini API ошибка {e.response.status_code} при генерации: {error_text}. Повтор через {wait_time:.1f}с (попытка {attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(wait_time)
+                    continue
+                raise
+
+            except Exception as e:
+                last_error = e
+                if attempt < self.max_retries - 1:
+                    wait_time = self._retry_delay(attempt)
+                    logger.warning(f"Gemini API исключение при генерации: {type(e).__name__}: {str(e)}. Повтор через {wait_time:.1f}с (попытка {attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(wait_time)
+                    continue
+                raise
 
         # Если все попытки неудачны
         if last_error:
@@ -342,118 +466,30 @@ class ContentGenerationService:
         product_material = product_info.get('материал', '')
         product_description = product_info.get('описание', '')
 
-        # Получаем категориально-специфичные настройки
-        category_settings = self._get_category_photography_settings(product_info)
+        # Статичная часть промпта собрана заранее для каждой категории,
+        # здесь подставляются только поля товара
+        category_key = self._get_photography_category(product_info)
 
         # Формируем информацию о материале и описании
-        material_line = f"MATERIAL: {product_material}" if product_material and product_material != "Не указано" else ""
+        has_material = bool(product_material) and product_material != "Не указано"
+        material_line = f"MATERIAL: {product_material}" if has_material else ""
         description_line = f"DESCRIPTION: {product_description}" if product_description and product_description != "Не указано" else ""
 
-        prompt = f"""You are a professional product photographer specializing in B2B wholesale e-commerce imagery for Russian marketplaces.
+        return _IMAGE_PROMPT_TEMPLATES[category_key].format(
+            product_name=product_name,
+            material_line=material_line,
+            description_line=description_line,
+            material_texture=product_material if has_material else 'material'
+        )
 
-PRODUCT INFORMATION:
-- Product: {product_name}
-{material_line}
-{description_line}
-
-PHOTOGRAPHY SCENE DESCRIPTION:
-Imagine a professional product photoshoot in a high-end studio environment. {category_settings['scene_description']} The setting conveys premium quality and reliability that B2B wholesale buyers expect from their suppliers.
-
-CAMERA SETUP:
-The product is captured using {category_settings['lens_type']} from {category_settings['camera_angle']}, positioned to showcase the product's key features, dimensions, and material quality. The composition follows {category_settings['composition_style']}, with the product occupying 70-80% of the frame as the hero element.
-
-LIGHTING DESIGN:
-Professional three-point lighting setup creates dimensional depth:
-- Main key light from large softbox positioned at 45-degree angle above-front, delivering soft directional illumination that reveals texture and form
-- Fill light at quarter intensity from opposite side, preventing harsh shadows while maintaining natural depth
-- Subtle rim light accentuating product edges and emphasizing {product_material if product_material and product_material != 'Не указано' else 'material'} texture
-- Natural-looking shadows falling at 30-degree angle, adding dimensionality without distraction
-- Gentle highlights and reflections that showcase craftsmanship and material quality
-
-BACKGROUND & ENVIRONMENT:
-{category_settings['background_description']}
-The composition is clean and distraction-free, with all extraneous objects, hands, watermarks, text, and graphic elements completely removed.
-
-VISUAL QUALITY & COLOR GRADING:
-- High-resolution macro-level detail revealing texture, weave, finish quality, and craftsmanship
-- Rich, vibrant {category_settings['color_style']}
-- Sharp focus throughout the product with subtle depth of field effect on background
-- Natural contrast that makes product stand out clearly against background
-- Authentic, non-over-processed aesthetic meeting 2025 e-commerce photography standards
-- Professional color accuracy for true-to-life product representation
-
-MARKETPLACE OPTIMIZATION:
-The final image must meet professional standards for major Russian B2B wholesale marketplaces (Ozon, Wildberries, AliExpress) and Telegram wholesale catalog channels. The photography should convey premium quality, inspire confidence in product reliability, and create desire for wholesale purchase.
-
-CRITICAL CONSTRAINTS:
-- Do NOT alter the product itself - ONLY enhance the presentation, lighting, and environment
-- Do NOT add watermarks, logos, text overlays, or any graphic elements
-- Do NOT change product colors, shape, or inherent characteristics
-- Preserve authentic product appearance while optimizing visual appeal through professional photography technique
-- Focus on creating trust and desire through lighting, composition, and background rather than artificial manipulation
-
-The goal is professional catalog photography that makes wholesale buyers want to touch, examine, and order this product in bulk quantity."""
-
-        return prompt
-
-    def _get_category_photography_settings(self, product_info: Dict[str, Any]) -> Dict[str, str]:
-        """
-        Получить категориально-специфичные фотографические настройки
-
-        На основе названия и материала товара определяет оптимальные настройки съемки:
-        - Тип объектива и угол камеры
-        - Описание сцены и фона
-        - Стиль композиции и цветокоррекции
-
-        Args:
-            product_info: Информация о товаре (название, материал, описание)
-
-        Returns:
-            Dict[str, str]: Словарь с фотографическими настройками для категории
-        """
+    def _get_photography_category(self, product_info: Dict[str, Any]) -> str:
+        """Определить категорию фотосъемки по названию товара"""
         product_name = product_info.get('название', '').lower()
-        product_material = product_info.get('материал', '').lower()
-
-        # Определяем категорию на основе названия и материала
-        if any(word in product_name for word in ['бокал', 'стакан', 'ваза', 'посуд', 'тарелка', 'чашка', 'кружка', 'стекл']):
-            return {
-                'scene_description': 'The glass/dishware item is positioned on a pristine white marble surface with subtle natural veining, creating an elegant foundation.',
-                'lens_type': 'macro lens (100mm equivalent)',
-                'camera_angle': 'slightly elevated 20-degree angle',
-                'composition_style': 'dynamic 5-degree tilt for visual energy',
-                'background_description': 'Bright, clean white background with subtle gradient to light gray at edges, suggesting modern kitchen environment. Soft natural window light aesthetic creating crystal-clear transparency and elegant reflections that showcase glass quality.',
-                'color_style': 'bright, high-contrast with enhanced clarity for glass transparency and reflections'
-            }
-
-        elif any(word in product_name for word in ['ткань', 'текстиль', 'полотенце', 'постельное', 'одеяло', 'подушка', 'плед']):
-            return {
-                'scene_description': 'The textile product is artfully arranged on natural wooden surface, showcasing fabric texture, drape, and tactile quality.',
-                'lens_type': '85mm portrait lens',
-                'camera_angle': 'eye-level with slight 10-degree elevation',
-                'composition_style': 'gentle organic arrangement highlighting fabric flow and softness',
-                'background_description': 'Warm neutral background (light beige to soft gray) with natural wood texture accent. Soft diffused lighting mimicking natural daylight from window, creating gentle shadows that emphasize textile softness and weave detail.',
-                'color_style': 'warm, natural tones with emphasis on fabric texture detail and material quality'
-            }
-
-        elif any(word in product_name for word in ['электро', 'гаджет', 'провод', 'зарядка', 'устройство', 'техник']):
-            return {
-                'scene_description': 'The electronic item is placed on sleek modern surface in minimalist tech-forward environment.',
-                'lens_type': 'standard 50mm lens with precise focus',
-                'camera_angle': 'straight-on eye-level for geometric precision',
-                'composition_style': 'perfectly centered alignment emphasizing clean lines and technical precision',
-                'background_description': 'Minimalist gradient background transitioning from pure white at center to light cool gray at edges. Tech-aesthetic lighting with subtle blue undertones suggesting precision, innovation, and modernity.',
-                'color_style': 'crisp, high-contrast with slight cool color temperature for modern tech aesthetic'
-            }
-
-        else:  # Универсальные товары
-            return {
-                'scene_description': 'The product is positioned on clean professional surface in neutral studio environment.',
-                'lens_type': 'standard 50mm lens',
-                'camera_angle': 'slightly elevated 15-degree angle for optimal perspective',
-                'composition_style': 'centered with subtle asymmetric placement for visual interest',
-                'background_description': 'Clean professional white to light gray background with soft gradient. Studio lighting setup creating modern, fresh aesthetic suitable for any product category.',
-                'color_style': 'balanced, true-to-life colors with enhanced vibrancy'
-            }
+
+        for category_key, keywords in _PHOTOGRAPHY_CATEGORY_KEYWORDS:
+            if any(word in product_name for word in keywords):
+                return category_key
+        return 'universal'
 
     def _create_description_prompt(self, product_info: Dict[str, Any]) -> str:
         """Создать промпт для генерации описания товара"""
@@ -529,14 +565,33 @@ The goal is professional catalog photography that makes wholesale buyers want to
 
             enhanced_info = product_info.copy()
 
-            # Генерация улучшенного изображения через Gemini 2.5 Flash Image
-            if generate_image and product_image_bytes:
+            async def skip():
+                return None
+
+            # Изображение, описание и маркетинговый текст независимы - запрашиваем их одновременно
+            generate_image = generate_image and product_image_bytes
+            if generate_image:
                 logger.info("🖼️ Запускаем улучшение изображения через Gemini 2.5 Flash Image")
-                enhanced_image = await self.generate_enhanced_image(
+
+            results = await asyncio.gather(
+                self.generate_enhanced_image(
                     product_image_bytes,
                     product_info,
                     background_type="professional_studio"
-                )
+                ) if generate_image else skip(),
+                self.generate_product_description(product_info) if generate_description else skip(),
+                self.generate_marketing_text(product_info) if generate_marketing else skip(),
+                return_exceptions=True
+            )
+
+            # Ошибка одной части не отменяет остальные результаты
+            for i, part_name in enumerate(("изображения", "описания", "маркетингового текста")):
+                if isinstance(results[i], Exception):
+                    logger.error(f"Ошибка при генерации {part_name}: {results[i]}")
+                    results[i] = None
+            enhanced_image, description, marketing_text = results
+
+            if generate_image:
                 if enhanced_image:
                     enhanced_info['enhanced_image_bytes'] = enhanced_image
                     logger.info("✅ Изображение успешно улучшено")
@@ -546,27 +601,17 @@ The goal is professional catalog photography that makes wholesale buyers want to
                     enhanced_info['enhanced_original'] = True
                     logger.warning("⚠️ Не удалось улучшить изображение, используем оригинальное")
 
-            # Генерация описания
-            if generate_description:
-                description = await self.generate_product_description(product_info)
-                if description:
-                    enhanced_info['generated_description'] = description
+            if description:
+                enhanced_info['generated_description'] = description
 
-            # Генерация маркетингового текста
-            if generate_marketing:
-                marketing_text = await self.generate_marketing_text(product_info)
-                if marketing_text:
-                    enhanced_info['marketing_text'] = marketing_text
+            if marketing_text:
+                enhanced_info['marketing_text'] = marketing_text
 
             logger.info("Завершено комплексное улучшение контента товара")
             return enhanced_info
 
         except Exception as e:
-            # Дополнительная диагностика для отладки
-            import traceback
-            error_details = traceback.format_exc()
-            logger.error(f"Ошибка при комплексном улучшении контента: {e}")
-            logger.error(f"Full traceback: {error_details}")
+            logger.exception(f"Ошибка при комплексном улучшении контента: {e}")
             return product_info
 
     async def batch_enhance_products(self, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
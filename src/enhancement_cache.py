@@ -0,0 +1,146 @@
+"""
+Постоянный кеш результатов улучшения контента товаров
+
+Полный результат генерации сохраняется по ключу (product_id, хеш фото), поэтому
+повторное улучшение товара после сбоя загрузки или сохранения не вызывает Gemini заново.
+После успешного сохранения запись удаляется: новый запрос на улучшение генерирует контент заново.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from src.config import ENHANCEMENT_CACHE_PATH, ENHANCEMENT_CACHE_SIZE_LIMIT_MB
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(product_id: str, image_bytes: Optional[bytes]) -> str:
+    """Ключ кеша: product_id + blake2b-хеш изображения"""
+    image_hash = hashlib.blake2b(image_bytes or b'', digest_size=16).hexdigest()
+    return f"{product_id}:{image_hash}"
+
+
+def is_complete_result(result: Dict[str, Any]) -> bool:
+    """Результат пригоден для кеша: есть улучшенное фото (не оригинал), описание и маркетинговый текст"""
+    return bool(
+        result.get('enhanced_image_bytes')
+        and not result.get('enhanced_original')
+        and result.get('generated_description')
+        and result.get('marketing_text')
+    )
+
+
+class EnhancementCache:
+    """Кеш результатов enhance_product_content в SQLite с вытеснением по LRU"""
+
+    def __init__(self, path: str = ENHANCEMENT_CACHE_PATH,
+                 size_limit_mb: int = ENHANCEMENT_CACHE_SIZE_LIMIT_MB):
+        self.size_limit = size_limit_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self._conn = None
+
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS enhancements ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+            logger.info(f"Кеш улучшенного контента: {path}")
+        except Exception as e:
+            # Без кеша бот продолжает работать, просто генерирует контент заново
+            logger.error(f"Не удалось открыть кеш улучшенного контента {path}: {e}")
+            self._conn = None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Получить сохраненный результат или None"""
+        if self._conn is None:
+            return None
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value FROM enhancements WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                self._conn.execute(
+                    "UPDATE enhancements SET accessed_at = ? WHERE key = ?", (time.time(), key)
+                )
+                self._conn.commit()
+            return pickle.loads(row[0])
+        except Exception as e:
+            logger.error(f"Ошибка чтения кеша улучшенного контента: {e}")
+            return None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        """Сохранить результат и вытеснить давно не использованные записи сверх лимита"""
+        if self._conn is None:
+            return
+        try:
+            value = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO enhancements (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, len(value), time.time())
+                )
+                self._evict()
+                self._conn.commit()
+        except Exception as e:
+            logger.error(f"Ошибка записи в кеш улучшенного контента: {e}")
+
+    def delete(self, key: str):
+        """Удалить запись (результат сохранен, повтор больше не нужен)"""
+        if self._conn is None:
+            return
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM enhancements WHERE key = ?", (key,))
+                self._conn.commit()
+        except Exception as e:
+            logger.error(f"Ошибка удаления из кеша улучшенного контента: {e}")
+
+    def _evict(self):
+        """Удаляет самые старые по доступу записи, пока кеш больше size_limit"""
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM enhancements").fetchone()[0]
+        if total_size <= self.size_limit:
+            return
+
+        rows = self._conn.execute("SELECT key, size FROM enhancements ORDER BY accessed_at").fetchall()
+        stale_keys = []
+        for key, size in rows:
+            if total_size <= self.size_limit:
+                break
+            stale_keys.append((key,))
+            total_size -= size
+
+        self._conn.executemany("DELETE FROM enhancements WHERE key = ?", stale_keys)
+        logger.info(f"Из кеша улучшенного контента вытеснено записей: {len(stale_keys)}")
+
+    def close(self):
+        """Закрыть соединение с базой"""
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+
+# Глобальный экземпляр кеша
+_enhancement_cache = None
+
+def get_enhancement_cache() -> EnhancementCache:
+    """Получить глобальный экземпляр кеша улучшенного контента"""
+    global _enhancement_cache
+    if _enhancement_cache is None:
+        _enhancement_cache = EnhancementCache()
+    return _enhancement_cache
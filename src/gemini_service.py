@@ -49,7 +49,9 @@ class GeminiService:
 
         self.api_key = GEMINI_API_KEY
         self.timeout = 30.0  # 30 секунд таймаут
+        self.connect_timeout = 5.0  # Недоступный прокси/хост должен отваливаться быстро
         self.max_retries = 3
+        self._http_client = None  # Постоянный клиент, создается при первом вызове API
 
         # Проверяем доступность API (отложенная проверка при первом использовании)
         self._connection_tested = False
@@ -131,6 +133,21 @@ class GeminiService:
             logger.error(f"Ошибка при подготовке изображения: {e}")
             raise ValueError(f"Не удалось обработать изображение: {e}")
 
+    def _get_http_client(self, proxies: Dict[str, str]) -> httpx.AsyncClient:
+        """Постоянный HTTP клиент: соединения с Gemini API переиспользуются между вызовами (keep-alive)"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                proxies=proxies if proxies else None
+            )
+        return self._http_client
+
+    async def close(self):
+        """Закрыть HTTP клиент"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
     async def call_gemini_api(self, text: str, image_bytes: Optional[bytes] = None, image_mime: Optional[str] = None) -> Dict[str, Any]:
         """Вызов Gemini API через HTTP"""
         payload = {
@@ -162,50 +179,50 @@ class GeminiService:
 
         last_error = None
 
-        async with httpx.AsyncClient(timeout=self.timeout, proxies=proxies if proxies else None) as client:
-            for attempt in range(self.max_retries):
-                try:
-                    logger.info(f"Попытка вызова Gemini API {attempt + 1}/{self.max_retries}")
-
-                    response = await client.post(
-                        endpoint,
-                        params=params,
-                        headers=headers,
-                        json=payload
-                    )
-
-                    # Retry на 503 (service unavailable) или 429 (rate limit)
-                    if response.status_code in (503, 429):
-                        if attempt < self.max_retries - 1:
-                            wait_time = 2 ** attempt  # Exponential backoff
-                            logger.warning(f"Gemini API вернул {response.status_code}. Повторная попытка через {wait_time}с (попытка {attempt + 1}/{self.max_retries})")
-                            await asyncio.sleep(wait_time)
-                            continue
-                        else:
-                            response.raise_for_status()
-
-                    response.raise_for_status()
-                    return response.json()
-
-                except httpx.HTTPStatusError as e:
-                    last_error = e
-                    # Retry на 503 или 429 если есть попытки
-                    if e.response.status_code in (503, 429) and attempt < self.max_retries - 1:
-                        wait_time = 2 ** attempt
-                        error_text = e.response.text[:200] if e.response.text else "No response text"
-                        logger.warning(f"Gemini API ошибка {e.response.status_code}: {error_text}. Повтор через {wait_time}с (попытка {attempt + 1}/{self.max_retries})")
-                        await asyncio.sleep(wait_time)
-                        continue
-                    raise
+        client = self._get_http_client(proxies)
+        for attempt in range(self.max_retries):
+            try:
+                logger.info(f"Попытка вызова Gemini API {attempt + 1}/{self.max_retries}")
 
-                except Exception as e:
-                    last_error = e
+                response = await client.post(
+                    endpoint,
+                    params=params,
+                    headers=headers,
+                    json=payload
+                )
+
+                # Retry на 503 (service unavailable) или 429 (rate limit)
+                if response.status_code in (503, 429):
                     if attempt < self.max_retries - 1:
-                        wait_time = 2 ** attempt
-                        logger.warning(f"Gemini API исключение: {type(e).__name__}: {str(e)}. Повтор через {wait_time}с (попытка {attempt + 1}/{self.max_retries})")
+                        wait_time = 2 ** attempt  # Exponential backoff
+                        logger.warning(f"Gemini API вернул {response.status_code}. Повторная попытка через {wait_time}с (попытка {attempt + 1}/{self.max_retries})")
                         await asyncio.sleep(wait_time)
                         continue
-                    raise
+                    else:
+                        response.raise_for_status()
+
+                response.raise_for_status()
+                return response.json()
+
+            except httpx.HTTPStatusError as e:
+                last_error = e
+                # Retry на 503 или 429 если есть попытки
+                if e.response.status_code in (503, 429) and attempt < self.max_retries - 1:
+                    wait_time = 2 ** attempt
+                    error_text = e.response.text[:200] if e.response.text else "No response text"
+                    logger.warning(f"Gemini API ошибка {e.response.status_code}: {error_text}. Повтор через {wait_time}с (попытка {attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(wait_time)
+                    continue
+                raise
+
+            except Exception as e:
+                last_error = e
+                if attempt < self.max_retries - 1:
+                    wait_time = 2 ** attempt
+                    logger.warning(f"Gemini API исключение: {type(e).__name__}: {str(e)}. Повтор через {wait_time}с (попытка {attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(wait_time)
+                    continue
+                raise
 
         # Если все попытки неудачны
         if last_error:
@@ -1,11 +1,58 @@
 import gspread
 import logging
 import time
+from dataclasses import dataclass
 from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
 from src.config import GOOGLE_SHEETS_CREDENTIALS_FILE, GOOGLE_SHEETS_SPREADSHEET_ID, GOOGLE_DRIVE_SCOPES
 
 logger = logging.getLogger(__name__)
 
+# Размер пула HTTPS-соединений к Google API: вызовы Sheets выполняются параллельно
+# в пуле потоков asyncio.to_thread, а стандартного пула requests (10) для этого мало
+SHEETS_POOL_SIZE = 32
+
+# Максимальная длина краткого описания в карточке товара
+PRODUCT_SHORT_DESC_LENGTH = 150
+
+
+@dataclass(frozen=True, slots=True)
+class ProductCard:
+    """Данные товара, подготовленные для отображения в списке 'Мои товары'"""
+    product_id: str
+    name: str
+    description: str
+    short_desc: str
+    quantity: str
+    created_at: str
+    photo_url: str
+    enhanced_image_url: str
+    has_enhanced_content: bool
+
+    @classmethod
+    def from_product(cls, product):
+        """Создание карточки из нормализованной записи товара (см. GoogleSheetsManager._normalize_product)"""
+        description = product['description']
+        if not description:
+            short_desc = "Описание отсутствует"
+        elif len(description) > PRODUCT_SHORT_DESC_LENGTH:
+            short_desc = description[:PRODUCT_SHORT_DESC_LENGTH - 3] + "..."
+        else:
+            short_desc = description
+
+        return cls(
+            product_id=str(product.get('product_id', '')),
+            name=product['name'],
+            description=description,
+            short_desc=short_desc,
+            quantity=product['quantity'],
+            created_at=product['created_at'],
+            photo_url=product['photo_urls'],
+            enhanced_image_url=GoogleSheetsManager._first_filled(product, 'enhanced_image_url'),
+            has_enhanced_content=bool(GoogleSheetsManager._first_filled(product, 'enhanced_description')),
+        )
+
+
 class GoogleSheetsManager:
     def __init__(self):
         self.scope = GOOGLE_DRIVE_SCOPES
@@ -14,6 +61,9 @@ class GoogleSheetsManager:
             scopes=self.scope
         )
         self.client = gspread.authorize(self.creds)
+        self.client.session.mount(
+            "https://", HTTPAdapter(pool_connections=4, pool_maxsize=SHEETS_POOL_SIZE)
+        )
         self.spreadsheet = self.client.open_by_key(GOOGLE_SHEETS_SPREADSHEET_ID)
 
         # Получаем или создаем листы
@@ -23,6 +73,7 @@ class GoogleSheetsManager:
         self.products_sheet = self._get_or_create_sheet("products")
         self.content_usage_sheet = self._get_or_create_sheet("content_usage")
         self.content_limits_sheet = self._get_or_create_sheet("content_limits")
+        self.daily_limits_sheet = self._get_or_create_sheet("daily_limits")
 
         # Инициализируем заголовки
         self._init_sheet_headers()
@@ -76,42 +127,44 @@ class GoogleSheetsManager:
             "daily_content_enhancements", "last_reset_date", "total_generations"
         ]
 
-        # Проверяем и добавляем заголовки если нужно
-        try:
-            if not self.suppliers_sheet.get_all_values():
-                self.suppliers_sheet.append_row(suppliers_headers)
-        except:
-            self.suppliers_sheet.append_row(suppliers_headers)
-
-        try:
-            if not self.locations_sheet.get_all_values():
-                self.locations_sheet.append_row(locations_headers)
-        except:
-            self.locations_sheet.append_row(locations_headers)
+        # Заголовки для листа daily_limits (token bucket на пару товар + действие)
+        daily_limits_headers = [
+            "user_id", "product_id", "action_type", "tokens_remaining", "last_refill_ts"
+        ]
 
-        try:
-            if not self.channels_sheet.get_all_values():
-                self.channels_sheet.append_row(channels_headers)
-        except:
-            self.channels_sheet.append_row(channels_headers)
+        sheets_with_headers = [
+            (self.suppliers_sheet, suppliers_headers),
+            (self.locations_sheet, locations_headers),
+            (self.channels_sheet, channels_headers),
+            (self.products_sheet, products_headers),
+            (self.content_usage_sheet, content_usage_headers),
+            (self.content_limits_sheet, content_limits_headers),
+            (self.daily_limits_sheet, daily_limits_headers),
+        ]
 
+        # Первые строки всех листов читаем одним batchGet вместо загрузки каждого листа целиком
         try:
-            if not self.products_sheet.get_all_values():
-                self.products_sheet.append_row(products_headers)
-        except:
-            self.products_sheet.append_row(products_headers)
+            response = self.spreadsheet.values_batch_get(
+                [f"'{sheet.title}'!1:1" for sheet, _ in sheets_with_headers]
+            )
+            first_rows = [value_range.get('values') for value_range in response.get('valueRanges', [])]
+        except Exception as e:
+            logger.warning(f"Не удалось пакетно прочитать заголовки листов: {e}")
+            first_rows = []
 
-        try:
-            if not self.content_usage_sheet.get_all_values():
-                self.content_usage_sheet.append_row(content_usage_headers)
-        except:
-            self.content_usage_sheet.append_row(content_usage_headers)
+        if len(first_rows) != len(sheets_with_headers):
+            # Запасной вариант - проверяем листы по одному
+            first_rows = []
+            for sheet, _ in sheets_with_headers:
+                try:
+                    first_rows.append(sheet.row_values(1))
+                except Exception:
+                    first_rows.append(None)
 
-        try:
-            if not self.content_limits_sheet.get_all_values():
-                self.content_limits_sheet.append_row(content_limits_headers)
-        except:
-            self.content_limits_sheet.append_row(content_limits_headers)
+        # Добавляем заголовки в пустые листы
+        for (sheet, headers), first_row in zip(sheets_with_headers, first_rows):
+            if not first_row:
+                sheet.append_row(headers)
 
     def _safe_int(self, value, default=1):
         """Безопасное преобразование в int"""
@@ -136,47 +189,74 @@ class GoogleSheetsManager:
         self.invalidate_cache("suppliers")
         return internal_id
 
-    def _get_cached_records(self, sheet_name, sheet):
-        """Получить записи из кеша или загрузить из API"""
+    def _get_cache_entry(self, sheet_name, sheet):
+        """
+        Получить запись кеша листа ({'records', 'timestamp', 'indexes'}) или загрузить из API.
+        Вызывается из потоков asyncio.to_thread, поэтому с кешем работаем только через
+        локальную ссылку на запись: invalidate_cache в другом потоке может удалить ее в любой момент
+        """
         cache_key = f"{sheet_name}_records"
         current_time = time.time()
 
         # Проверяем кеш
-        if cache_key in self._cache:
-            cache_data = self._cache[cache_key]
-            if current_time - cache_data['timestamp'] < self._cache_timeout:
-                return cache_data['records']
+        cache_data = self._cache.get(cache_key)
+        if cache_data is not None and current_time - cache_data['timestamp'] < self._cache_timeout:
+            return cache_data
 
         # Загружаем из API
         records = sheet.get_all_records()
 
         # Сохраняем в кеш
-        self._cache[cache_key] = {
+        cache_data = {
             'records': records,
-            'timestamp': current_time
+            'timestamp': current_time,
+            'indexes': {}
         }
+        self._cache[cache_key] = cache_data
+
+        return cache_data
 
-        return records
+    def _get_cached_records(self, sheet_name, sheet):
+        """Получить записи из кеша или загрузить из API"""
+        return self._get_cache_entry(sheet_name, sheet)['records']
+
+    def _get_cached_index(self, sheet_name, sheet, key_field, many=False):
+        """
+        Получить индекс записей листа по значению колонки key_field (ключ - строка).
+        Индекс строится один раз на каждую загрузку кеша и сбрасывается вместе с ним.
+        many=True - значением индекса будет список записей, иначе первая найденная запись
+        """
+        # Индекс строится из записей той же записи кеша, в которой он сохраняется
+        cache_data = self._get_cache_entry(sheet_name, sheet)
+        indexes = cache_data['indexes']
+        index_key = (key_field, many)
+
+        index = indexes.get(index_key)
+        if index is None:
+            index = {}
+            for record in cache_data['records']:
+                key = str(record.get(key_field))
+                if many:
+                    index.setdefault(key, []).append(record)
+                else:
+                    index.setdefault(key, record)
+            indexes[index_key] = index
+
+        return index
 
     def invalidate_cache(self, sheet_name=None):
         """Очистить кеш для конкретного листа или всего кеша"""
         if sheet_name:
-            cache_key = f"{sheet_name}_records"
-            if cache_key in self._cache:
-                del self._cache[cache_key]
+            self._cache.pop(f"{sheet_name}_records", None)
         else:
             self._cache.clear()
 
     def get_supplier_by_telegram_id(self, telegram_user_id):
         """Получение поставщика по telegram_user_id"""
         try:
-            all_records = self._get_cached_records("suppliers", self.suppliers_sheet)
-            for record in all_records:
-                # Сравниваем как число и как строку для надежности
-                telegram_id = record.get("telegram_user_id")
-                if telegram_id == telegram_user_id or str(telegram_id) == str(telegram_user_id):
-                    return record
-            return None
+            # Сравниваем как строку для надежности (в таблице ID может быть числом)
+            suppliers_by_telegram_id = self._get_cached_index("suppliers", self.suppliers_sheet, "telegram_user_id")
+            return suppliers_by_telegram_id.get(str(telegram_user_id))
         except:
             return None
 
@@ -201,14 +281,11 @@ class GoogleSheetsManager:
     def get_locations_by_supplier_id(self, supplier_internal_id):
         """Получение всех локаций поставщика"""
         try:
-            all_records = self._get_cached_records("locations", self.locations_sheet)
-            locations = []
-            for record in all_records:
-                supplier_id_field = record.get("supplier_internal_id")
-                # Сравниваем как число и как строку для надежности
-                if supplier_id_field == supplier_internal_id or str(supplier_id_field) == str(supplier_internal_id):
-                    locations.append(record)
-            return locations
+            # Сравниваем как строку для надежности (в таблице ID может быть числом)
+            locations_by_supplier = self._get_cached_index(
+                "locations", self.locations_sheet, "supplier_internal_id", many=True
+            )
+            return list(locations_by_supplier.get(str(supplier_internal_id), []))
         except:
             return []
 
@@ -218,49 +295,69 @@ class GoogleSheetsManager:
             print(f"GoogleSheets: Updating location {location_id}")
             print(f"GoogleSheets: market_name={market_name}, pavilion_number={pavilion_number}, contact_phones={contact_phones}")
 
-            all_records = self.locations_sheet.get_all_records()
-            print(f"GoogleSheets: Found {len(all_records)} location records")
-
-            for i, record in enumerate(all_records):
-                stored_location_id = record.get("location_id")
-                print(f"GoogleSheets: Comparing with record {i}: {stored_location_id}")
-
-                if str(stored_location_id) == str(location_id):
-                    row_num = i + 2  # +2 из-за заголовков и 0-based индексации
-                    print(f"GoogleSheets: Found location at row {row_num}")
-
-                    # Получаем текущие данные
-                    current_row = self.locations_sheet.row_values(row_num)
-                    print(f"GoogleSheets: Current row data: {current_row}")
-
-                    # Обновляем только переданные поля
-                    if market_name is not None:
-                        current_row[2] = market_name  # market_name
-                        print(f"GoogleSheets: Updated market_name to {market_name}")
-                    if pavilion_number is not None:
-                        current_row[3] = pavilion_number  # pavilion_number
-                        print(f"GoogleSheets: Updated pavilion_number to {pavilion_number}")
-                    if contact_phones is not None:
-                        current_row[4] = contact_phones  # contact_phones
-                        print(f"GoogleSheets: Updated contact_phones to {contact_phones}")
-
-                    print(f"GoogleSheets: Final row data: {current_row}")
-
-                    # Обновляем строку
-                    self.locations_sheet.update(f"A{row_num}:E{row_num}", [current_row])
-                    print(f"GoogleSheets: Successfully updated row {row_num}")
-                    # Инвалидируем кеш для locations
-                    self.invalidate_cache("locations")
-                    return True
+            location_id = str(location_id)
 
-            print(f"GoogleSheets: Location {location_id} not found")
-            return False
+            # Номер строки ищем по кешу, актуальные значения берем из самой строки
+            all_records = self._get_cached_records("locations", self.locations_sheet)
+            print(f"GoogleSheets: Found {len(all_records)} location records")
+            row_num, current_row = self._read_location_row(location_id, all_records)
+
+            if row_num is None:
+                # Лист мог измениться вне бота (ручные правки, скрипты) - кеш устарел,
+                # ищем строку по свежим данным
+                print(f"GoogleSheets: Cached row for location {location_id} is stale, re-reading sheet")
+                row_num, current_row = self._read_location_row(location_id, self.locations_sheet.get_all_records())
+
+            if row_num is None:
+                print(f"GoogleSheets: Location {location_id} not found")
+                return False
+
+            print(f"GoogleSheets: Found location at row {row_num}")
+            print(f"GoogleSheets: Current row data: {current_row}")
+
+            # row_values не возвращает пустые ячейки в конце строки
+            current_row.extend([''] * (5 - len(current_row)))
+
+            # Обновляем только переданные поля
+            if market_name is not None:
+                current_row[2] = market_name  # market_name
+                print(f"GoogleSheets: Updated market_name to {market_name}")
+            if pavilion_number is not None:
+                current_row[3] = pavilion_number  # pavilion_number
+                print(f"GoogleSheets: Updated pavilion_number to {pavilion_number}")
+            if contact_phones is not None:
+                current_row[4] = contact_phones  # contact_phones
+                print(f"GoogleSheets: Updated contact_phones to {contact_phones}")
+
+            print(f"GoogleSheets: Final row data: {current_row}")
+
+            # Обновляем строку
+            self.locations_sheet.update(f"A{row_num}:E{row_num}", [current_row[:5]])
+            print(f"GoogleSheets: Successfully updated row {row_num}")
+            # Инвалидируем кеш для locations
+            self.invalidate_cache("locations")
+            return True
         except Exception as e:
             print(f"Error updating location: {e}")
             import traceback
             traceback.print_exc()
             return False
 
+    def _read_location_row(self, location_id, records):
+        """
+        Найти строку локации по записям листа и прочитать ее текущие значения.
+        Возвращает (номер строки, значения) или (None, None), если строки нет
+        или в ней уже другой location_id (записи устарели)
+        """
+        for i, record in enumerate(records):
+            if str(record.get("location_id")) == location_id:
+                row_num = i + 2  # +2 из-за заголовков и 0-based индексации
+                current_row = self.locations_sheet.row_values(row_num)
+                if current_row and str(current_row[0]) == location_id:
+                    return row_num, current_row
+                return None, None
+        return None, None
+
     def delete_location(self, location_id):
         """Удаление локации"""
         try:
@@ -290,11 +387,8 @@ class GoogleSheetsManager:
             traceback.print_exc()
             return False
 
-    def add_product(self, product_id, supplier_internal_id, location_id, product_data, image_urls):
-        """Добавление нового товара с новой JSON-структурой"""
-        from datetime import datetime
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
+    def _build_product_row(self, product_id, supplier_internal_id, location_id, product_data, image_urls, created_at):
+        """Сборка строки товара в соответствии со структурой листа products"""
         # Убеждаемся что quantity это число
         quantity = product_data.get('quantity', 1)
         try:
@@ -315,15 +409,73 @@ class GoogleSheetsManager:
             str(product_data.get('упаковка', 'Не указано')),           # упаковка
             str(image_urls) if image_urls else "",            # photo_urls
             quantity,                                         # quantity (число)
-            now,                                              # created_at
+            created_at,                                       # created_at
         ]
 
+        # Улучшенный контент (колонки M-Q) пишем сразу, без отдельного обновления строки
+        enhanced_image_url = product_data.get('enhanced_image_url') or ''
+        enhanced_description = product_data.get('enhanced_description') or ''
+        marketing_text = product_data.get('marketing_text') or ''
+        if enhanced_image_url or enhanced_description or marketing_text:
+            content_version = self._safe_int(product_data.get('content_version'))
+            if enhanced_image_url or enhanced_description:
+                content_version += 1
+            row.extend([
+                enhanced_image_url,                                     # enhanced_image_url
+                enhanced_description,                                   # enhanced_description
+                product_data.get('content_generated_at') or created_at, # content_generated_at
+                str(content_version),                                   # content_version
+                marketing_text,                                         # marketing_text
+            ])
+
+        return row
+
+    def add_product(self, product_id, supplier_internal_id, location_id, product_data, image_urls):
+        """Добавление нового товара с новой JSON-структурой"""
+        from datetime import datetime
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        row = self._build_product_row(product_id, supplier_internal_id, location_id, product_data, image_urls, now)
 
         self.products_sheet.append_row(row)
         # Инвалидируем кеш для products
         self.invalidate_cache("products")
         return product_id
 
+    def add_products_bulk(self, products):
+        """
+        Добавление нескольких товаров одним запросом к Sheets API
+
+        Args:
+            products: Список словарей с ключами product_id, supplier_internal_id,
+                      location_id, product_data, image_urls (как у add_product)
+
+        Returns:
+            Список product_id добавленных товаров
+        """
+        if not products:
+            return []
+
+        from datetime import datetime
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        rows = [
+            self._build_product_row(
+                product['product_id'],
+                product['supplier_internal_id'],
+                product['location_id'],
+                product['product_data'],
+                product.get('image_urls'),
+                now
+            )
+            for product in products
+        ]
+
+        self.products_sheet.append_rows(rows)
+        # Инвалидируем кеш для products
+        self.invalidate_cache("products")
+        return [product['product_id'] for product in products]
+
     def add_product_legacy(self, product_id, supplier_internal_id, location_id, short_description,
                           full_description, quantity, image_urls):
         """Добавление нового товара (legacy-метод для обратной совместимости)"""
@@ -348,6 +500,32 @@ class GoogleSheetsManager:
 
         return self.add_product(product_id, supplier_internal_id, location_id, product_data, image_urls)
 
+    @staticmethod
+    def _first_filled(record, *keys):
+        """Первое непустое значение среди указанных колонок (в виде строки)"""
+        for key in keys:
+            value = record.get(key)
+            if value is not None and str(value).strip() and str(value) != 'None':
+                return str(value)
+        return ''
+
+    def _normalize_product(self, record):
+        """
+        Добавить к записи товара канонические ключи, чтобы обработчики
+        читали одно поле вместо цепочек fallback'ов по старым/новым колонкам:
+        name, description, quantity, created_at, photo_urls
+        """
+        product = dict(record)
+        product['name'] = self._first_filled(record, 'название', 'name')
+        # Приоритет: улучшенное описание AI > полное описание > базовое описание
+        product['description'] = self._first_filled(
+            record, 'enhanced_description', 'full_description', 'описание', 'description'
+        )
+        product['quantity'] = self._first_filled(record, 'quantity') or '0'
+        product['created_at'] = self._first_filled(record, 'created_at')
+        product['photo_urls'] = self._first_filled(record, 'photo_urls')
+        return product
+
     def get_products_by_supplier_id(self, supplier_internal_id):
         """Получение всех товаров поставщика"""
         try:
@@ -357,21 +535,23 @@ class GoogleSheetsManager:
             for record in all_records:
                 supplier_id_field = record.get("supplier_id")
                 if supplier_id_field == supplier_internal_id or str(supplier_id_field) == str(supplier_internal_id):
-                    products.append(record)
+                    products.append(self._normalize_product(record))
 
             return products
         except Exception as e:
             logger.error(f"Error getting products: {e}")
             return []
 
+    def get_product_cards_by_supplier_id(self, supplier_internal_id):
+        """Получение товаров поставщика в виде карточек для отображения"""
+        return [ProductCard.from_product(product) for product in self.get_products_by_supplier_id(supplier_internal_id)]
+
     def get_product_by_id(self, product_id):
         """Получение товара по ID"""
         try:
-            all_records = self.products_sheet.get_all_records()
-            for record in all_records:
-                if record.get("product_id") == product_id or str(record.get("product_id")) == str(product_id):
-                    return record
-            return None
+            products_by_id = self._get_cached_index("products", self.products_sheet, "product_id")
+            record = products_by_id.get(str(product_id))
+            return self._normalize_product(record) if record else None
         except:
             return None
 
@@ -535,6 +715,8 @@ class GoogleSheetsManager:
                         current_data[16]   # marketing_text
                     ]])
 
+                    # Инвалидируем кеш для products
+                    self.invalidate_cache("products")
                     logger.info(f"Обновлен улучшенный контент для товара {product_id}")
                     return True
 
@@ -557,6 +739,7 @@ class GoogleSheetsManager:
                 usage_record.error_message or ""
             ]
             self.content_usage_sheet.append_row(row)
+            self.invalidate_cache("content_usage")
             return True
 
         except Exception as e:
@@ -566,7 +749,7 @@ class GoogleSheetsManager:
     def get_content_usage_by_user(self, user_id: int, target_date):
         """Получить записи об использовании для пользователя за указанную дату"""
         try:
-            all_records = self.content_usage_sheet.get_all_records()
+            all_records = self._get_cached_records("content_usage", self.content_usage_sheet)
             usage_records = []
 
             target_date_str = target_date.strftime("%Y-%m-%d")
@@ -586,7 +769,7 @@ class GoogleSheetsManager:
     def get_all_content_usage(self, user_id: int):
         """Получить все записи об использовании для пользователя"""
         try:
-            all_records = self.content_usage_sheet.get_all_records()
+            all_records = self._get_cached_records("content_usage", self.content_usage_sheet)
             usage_records = []
 
             for record in all_records:
@@ -690,6 +873,63 @@ class GoogleSheetsManager:
             logger.error(f"Ошибка при сбросе дневных лимитов: {e}")
             return False
 
+    def get_daily_limit_buckets(self, user_id: int):
+        """Состояния дневных лимитов пользователя: {(product_id, action_type): запись}"""
+        try:
+            records = self._get_cached_index(
+                "daily_limits", self.daily_limits_sheet, "user_id", many=True
+            ).get(str(user_id), [])
+            return {(str(record.get("product_id")), record.get("action_type")): record for record in records}
+        except Exception as e:
+            logger.error(f"Ошибка при получении дневных лимитов: {e}")
+            return {}
+
+    def get_daily_limit_bucket(self, user_id: int, product_id: str, action_type: str):
+        """Состояние дневного лимита для товара и действия или None"""
+        return self.get_daily_limit_buckets(user_id).get((str(product_id), action_type))
+
+    def _find_daily_limit_row(self, user_id, product_id: str, action_type: str, records):
+        """
+        Найти строку дневного лимита по записям листа и сверить ее с самим листом.
+        Возвращает номер строки или None, если строки нет или в ней уже другой ключ (записи устарели)
+        """
+        key = [str(user_id), str(product_id), action_type]
+        for i, record in enumerate(records):
+            if [str(record.get("user_id")), str(record.get("product_id")), record.get("action_type")] == key:
+                row_num = i + 2  # +2 из-за заголовков
+                current_row = self.daily_limits_sheet.row_values(row_num)
+                if [str(value) for value in current_row[:3]] == key:
+                    return row_num
+                return None
+        return None
+
+    def save_daily_limit_bucket(self, user_id: int, product_id: str, action_type: str,
+                                tokens_remaining: int, last_refill_ts: float):
+        """Создать или обновить состояние дневного лимита"""
+        try:
+            row = [user_id, product_id, action_type, tokens_remaining, last_refill_ts]
+            records = self._get_cached_records("daily_limits", self.daily_limits_sheet)
+            row_num = self._find_daily_limit_row(user_id, product_id, action_type, records)
+
+            if row_num is None:
+                # Кеш мог устареть (строки сдвинулись или запись уже добавлена) -
+                # перед добавлением новой строки ищем по свежим данным, чтобы не создать дубликат
+                row_num = self._find_daily_limit_row(
+                    user_id, product_id, action_type, self.daily_limits_sheet.get_all_records()
+                )
+
+            if row_num is not None:
+                self.daily_limits_sheet.update(f"A{row_num}:E{row_num}", [row])
+            else:
+                self.daily_limits_sheet.append_row(row)
+
+            self.invalidate_cache("daily_limits")
+            return True
+
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении дневного лимита: {e}")
+            return False
+
     def cleanup_old_usage_records(self, cutoff_date):
         """Очистить старые записи об использовании"""
         try:
@@ -706,6 +946,8 @@ class GoogleSheetsManager:
             for row_num in sorted(rows_to_delete, reverse=True):
                 self.content_usage_sheet.delete_rows(row_num, 1)
 
+            self.invalidate_cache("content_usage")
+
             if rows_to_delete:
                 logger.info(f"Удалено {len(rows_to_delete)} старых записей об использовании")
                 return True
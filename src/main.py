@@ -1,18 +1,25 @@
 import logging
 from logging.handlers import RotatingFileHandler
+import re
 import uuid
 import asyncio
-import requests
+import time
+import httpx
 from io import BytesIO
 from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
+from collections import OrderedDict
+from itertools import chain, repeat
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove, InputMediaPhoto
+from telegram.error import RetryAfter
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler, ConversationHandler
-from src.config import TELEGRAM_BOT_TOKEN, DEBUG, ENABLE_CONTENT_GENERATION, AUTO_GENERATE_CONTENT, LOCAL_ENHANCED_IMAGES_PATH
+from src.config import TELEGRAM_BOT_TOKEN, DEBUG, ENABLE_CONTENT_GENERATION, AUTO_GENERATE_CONTENT, LOCAL_ENHANCED_IMAGES_PATH, MAX_PHOTO_SIZE_MB
 from src.google_sheets import GoogleSheetsManager
 from src.gemini_service import get_gemini_service, initialize_gemini_service
 from src.image_storage import get_image_storage_service, initialize_image_storage
 from src.content_generation_service import get_content_generation_service
-from src.utils import escape_markdown
+from src.utils import escape_markdown, md_escape, utf16_len
+from src.rate_limiter import AsyncRateLimiter
+from src.enhancement_cache import get_enhancement_cache, make_cache_key, is_complete_result
 
 # Создаем директорию для логов, если не существует
 import os
@@ -55,16 +62,109 @@ PHOTO_UPLOAD, PHOTO_CONFIRMATION, LOCATION_SELECTION, QUANTITY_INPUT, PRODUCT_CO
 # Новые состояния для управления каналами
 ADD_CHANNEL_USERNAME, ADD_CHANNEL_DESCRIPTION, EDIT_CHANNEL_DESCRIPTION = range(14, 17)
 
+# Количество товаров на одной странице в "Мои товары"
+PRODUCTS_PAGE_SIZE = 5
+
+# Лимиты отправки сообщений Telegram: ~30 сообщений/сек на бота и ~1 сообщение/сек в один чат
+GLOBAL_SEND_RATE = 28
+CHAT_SEND_PERIOD = 1.05
+# Сколько ограничителей по чатам держать в памяти (вытесняются давно неактивные чаты)
+CHAT_LIMITERS_MAX_SIZE = 10000
+SEND_RETRY_ATTEMPTS = 3
+
+# Пулы соединений к Bot API: исходящие запросы отдельно от long polling (getUpdates)
+BOT_API_POOL_SIZE = 64
+BOT_API_POOL_TIMEOUT = 20
+
+# Количество фоновых воркеров для тяжелых операций (отправка списков товаров)
+BACKGROUND_WORKERS = 4
+
+# Максимум товаров, для которых контент генерируется одновременно
+AUTO_GENERATION_CONCURRENCY = 8
+
+# Максимум примеров улучшенных товаров (лимит sendMediaGroup - 10 элементов)
+ENHANCED_EXAMPLES_LIMIT = 10
+
+# Максимальная длина подписи к фото в Telegram
+CAPTION_MAX_LENGTH = 1024
+
+# Сколько хранить ответ getFile: ссылка на скачивание файла действительна не меньше часа
+TG_FILE_CACHE_TTL = 50 * 60
+TG_FILE_CACHE_MAX_SIZE = 1000
+
+# Проверка, что в photo_urls лежит ссылка, а не file_id или мусор
+_URL_RE = re.compile(r'^https?://\S{3,}$')
+
+# Полный URL файла Telegram: префикс /file/bot<token>/ может повторяться, берем путь после последнего
+_TG_FILE_URL_RE = re.compile(r'^(?:https?://api\.telegram\.org/file/bot[^/]+/)+(.+)$')
+
+# Префикс прямых ссылок на файлы бота
+_TG_FILE_URL_PREFIX = f"https://api.telegram.org/file/bot{TELEGRAM_BOT_TOKEN}/"
+
 class MarketBot:
     def __init__(self):
-        self.application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        self.application = (
+            Application.builder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .http_version('1.1')
+            .connection_pool_size(BOT_API_POOL_SIZE)
+            .pool_timeout(BOT_API_POOL_TIMEOUT)
+            .get_updates_http_version('1.1')
+            .get_updates_connection_pool_size(1)
+            .get_updates_pool_timeout(BOT_API_POOL_TIMEOUT)
+            .post_init(self._on_startup)
+            .post_shutdown(self._on_shutdown)
+            .build()
+        )
+        self._http_client = None  # Общий HTTP клиент для скачивания фото
         self._sheets_manager = None  # Приватный атрибут для синглтона
         self.gemini_service = None
         self.image_storage_service = None
         self.content_generation_service = None
         self.services_initialized = False
+        self._global_limiter = AsyncRateLimiter(GLOBAL_SEND_RATE, 1)
+        self._chat_limiters = OrderedDict()  # chat_id -> AsyncRateLimiter, от давно активных к недавним
+        self._task_queue = None  # Очередь фоновых задач, создается в initialize_services
+        self._workers = []
+        self._chat_job_locks = {}  # chat_id -> [asyncio.Lock, число задач, ожидающих или выполняющихся]
+        self._chat_job_seq = {}  # chat_id -> номер последней поставленной задачи
+        self._tg_file_cache = OrderedDict()  # file_id -> (File, время получения), от старых к новым
         self.setup_handlers()
 
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Общий асинхронный HTTP клиент (пул соединений переиспользуется между запросами)"""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(timeout=15, follow_redirects=True)
+        return self._http_client
+
+    async def _on_startup(self, application):
+        """Инициализация Google Sheets и сервисов при старте бота, а не на первом сообщении пользователя"""
+        try:
+            self.sheets_manager
+        except Exception as e:
+            # Ленивая инициализация повторит попытку при первом обращении
+            logger.error(f"Не удалось инициализировать Google Sheets при старте: {e}")
+
+        await self.initialize_services()
+
+    async def _on_shutdown(self, application):
+        """Освобождение ресурсов при остановке бота"""
+        # Останавливаем фоновых воркеров, чтобы не оставлять висящие задачи
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._task_queue = None
+
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+        for service in (self.gemini_service, self.content_generation_service):
+            if service is not None:
+                await service.close()
+
     @property
     def sheets_manager(self):
         """Ленивая инициализация GoogleSheetsManager как синглтон"""
@@ -136,7 +236,8 @@ class MarketBot:
                 logger.error(f"Failed to send reply message: {e}")
                 # Последний fallback - пробуем отправить напрямую пользователю
                 try:
-                    await query.bot.send_message(
+                    await self.send_with_flood_control(
+                        query.bot.send_message,
                         chat_id=query.from_user.id,
                         text=text,
                         reply_markup=reply_markup,
@@ -146,24 +247,102 @@ class MarketBot:
                     logger.error(f"Failed to send direct message: {e2}")
 
   
+    def _chat_limiter(self, chat_id: int) -> AsyncRateLimiter:
+        """Ограничитель частоты для чата (LRU, не больше CHAT_LIMITERS_MAX_SIZE чатов)"""
+        limiter = self._chat_limiters.get(chat_id)
+        if limiter is None:
+            limiter = AsyncRateLimiter(1, CHAT_SEND_PERIOD)
+            self._chat_limiters[chat_id] = limiter
+            while len(self._chat_limiters) > CHAT_LIMITERS_MAX_SIZE:
+                self._chat_limiters.popitem(last=False)
+        else:
+            self._chat_limiters.move_to_end(chat_id)
+        return limiter
+
+    async def send_with_flood_control(self, send_method, chat_id: int, **kwargs):
+        """Отправка сообщения с учетом лимитов Telegram (на бота и на чат) и повтором при RetryAfter"""
+        for attempt in range(1, SEND_RETRY_ATTEMPTS + 1):
+            async with self._global_limiter, self._chat_limiter(chat_id):
+                try:
+                    return await send_method(chat_id=chat_id, **kwargs)
+                except RetryAfter as e:
+                    if attempt == SEND_RETRY_ATTEMPTS:
+                        raise
+                    retry_after = float(e.retry_after)
+
+            logger.warning(f"Flood control для чата {chat_id}, повтор через {retry_after} сек (попытка {attempt})")
+            # Файл уже был прочитан при первой попытке - перематываем его
+            photo = kwargs.get('photo')
+            if hasattr(photo, 'seek'):
+                photo.seek(0)
+            await asyncio.sleep(retry_after)
+
+    async def _sheets(self, fn, *args, **kwargs):
+        """Выполняет синхронный вызов Google Sheets в пуле потоков, не блокируя цикл событий"""
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def _get_tg_file(self, bot, file_id: str):
+        """getFile с кешем по file_id, чтобы не запрашивать один и тот же файл повторно"""
+        now = time.monotonic()
+        cached = self._tg_file_cache.get(file_id)
+        if cached and now - cached[1] < TG_FILE_CACHE_TTL:
+            return cached[0]
+
+        file = await bot.get_file(file_id)
+
+        self._tg_file_cache[file_id] = (file, now)
+        self._tg_file_cache.move_to_end(file_id)
+        # Вытесняем самые давно полученные записи сверх лимита
+        while len(self._tg_file_cache) > TG_FILE_CACHE_MAX_SIZE:
+            self._tg_file_cache.popitem(last=False)
+        return file
+
+    async def download_image(self, url: str, timeout: float = None):
+        """Потоковое скачивание изображения с ограничением размера (MAX_PHOTO_SIZE_MB)
+
+        Returns:
+            bytes или None, если файл недоступен или слишком большой
+        """
+        max_bytes = MAX_PHOTO_SIZE_MB * 1024 * 1024
+        request_kwargs = {'timeout': timeout} if timeout else {}
+
+        async with self.http_client.stream('GET', url, **request_kwargs) as response:
+            if response.status_code != 200:
+                logger.error(f"Failed to download image, status code: {response.status_code}")
+                return None
+
+            # Отбрасываем заведомо большие файлы до чтения тела
+            content_length = int(response.headers.get('Content-Length') or 0)
+            if content_length > max_bytes:
+                logger.warning(f"Image too large: {content_length} bytes (limit {MAX_PHOTO_SIZE_MB} MB)")
+                return None
+
+            buffer = bytearray()
+            async for chunk in response.aiter_bytes():
+                buffer.extend(chunk)
+                if len(buffer) > max_bytes:
+                    logger.warning(f"Image exceeds {MAX_PHOTO_SIZE_MB} MB limit, download aborted")
+                    return None
+
+        return bytes(buffer)
+
     async def send_photo_from_telegram_url(self, chat_id: int, photo_url: str, caption: str = None, reply_markup=None):
         """Скачать фото с Telegram URL и отправить его как файл"""
         try:
             logger.info(f"Downloading photo from: {photo_url}")
 
-            # Скачиваем фото с использованием токена бота для аутентификации
-            headers = {}
-            response = requests.get(photo_url, headers=headers, timeout=10)
+            photo_bytes = await self.download_image(photo_url, timeout=10)
 
-            if response.status_code == 200:
-                logger.info(f"Photo downloaded successfully, size: {len(response.content)} bytes")
+            if photo_bytes:
+                logger.info(f"Photo downloaded successfully, size: {len(photo_bytes)} bytes")
 
                 # Создаем файл из скачанных данных
-                photo_file = BytesIO(response.content)
+                photo_file = BytesIO(photo_bytes)
                 photo_file.name = 'product_photo.jpg'  # Устанавливаем имя файла
 
                 # Отправляем фото в Telegram
-                await self.application.bot.send_photo(
+                await self.send_with_flood_control(
+                    self.application.bot.send_photo,
                     chat_id=chat_id,
                     photo=photo_file,
                     caption=caption,
@@ -172,7 +351,6 @@ class MarketBot:
                 logger.info("Photo sent successfully")
                 return True
             else:
-                logger.error(f"Failed to download photo, status code: {response.status_code}")
                 return False
 
         except Exception as e:
@@ -184,8 +362,6 @@ class MarketBot:
         if not description or description.strip() == "":
             return "Товар"
 
-        import re
-
         # Сначала пытаемся извлечь из фразы "Тип товара:" (самый надежный способ)
         type_match = re.search(r'- Тип товара:\s*([^-/]+)', description)
         if type_match:
@@ -256,8 +432,6 @@ class MarketBot:
             return "Описание отсутствует"
 
         # Ищем первое осмысленное предложение
-        import re
-
         # Убираем маркеры списка и лишние пробелы
         clean_desc = re.sub(r'^-\s*', '', description, flags=re.MULTILINE)
         clean_desc = re.sub(r'\s+', ' ', clean_desc).strip()
@@ -325,6 +499,8 @@ class MarketBot:
                 except Exception as e:
                     logger.warning(f"Не удалось инициализировать сервис генерации контента: {e}")
 
+            self._start_background_workers()
+
             self.services_initialized = True
             return True
 
@@ -332,6 +508,67 @@ class MarketBot:
             logger.error(f"Ошибка инициализации сервисов: {e}")
             return False
 
+    def _start_background_workers(self):
+        """Запуск пула фоновых воркеров (должен вызываться внутри event loop)"""
+        if self._task_queue is not None:
+            return
+
+        self._task_queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._background_worker(worker_id))
+            for worker_id in range(BACKGROUND_WORKERS)
+        ]
+        logger.info(f"Запущено фоновых воркеров: {BACKGROUND_WORKERS}")
+
+    async def _background_worker(self, worker_id: int):
+        """Воркер, выполняющий задачи из очереди"""
+        while True:
+            chat_id, seq, job, args = await self._task_queue.get()
+            try:
+                await self._run_chat_job(chat_id, seq, job, args)
+            finally:
+                self._task_queue.task_done()
+
+    async def _run_chat_job(self, chat_id: int, seq: int, job, args):
+        """
+        Выполнить задачу чата: задачи одного чата идут строго по очереди,
+        а задача, которую уже заменила более новая (повторное нажатие кнопки), пропускается
+        """
+        entry = self._chat_job_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                if seq != self._chat_job_seq.get(chat_id):
+                    logger.info(f"Задача {job.__name__} для чата {chat_id} заменена более новой, пропускаем")
+                    return
+                try:
+                    await job(*args)
+                except Exception as e:
+                    logger.exception(f"Ошибка в фоновой задаче {job.__name__} для чата {chat_id}: {e}")
+                    try:
+                        await self.send_with_flood_control(
+                            self.application.bot.send_message,
+                            chat_id=chat_id,
+                            text="❌ Ошибка при загрузке данных. Попробуйте еще раз позже."
+                        )
+                    except Exception as send_error:
+                        logger.error(f"Не удалось сообщить об ошибке в чат {chat_id}: {send_error}")
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_job_locks[chat_id]
+                if self._chat_job_seq.get(chat_id) == seq:
+                    del self._chat_job_seq[chat_id]
+
+    async def enqueue_background_job(self, chat_id: int, job, *args):
+        """Поставить задачу чата в очередь фоновых воркеров (или выполнить сразу, если воркеры не запущены)"""
+        seq = self._chat_job_seq.get(chat_id, 0) + 1
+        self._chat_job_seq[chat_id] = seq
+        if self._task_queue is None:
+            await self._run_chat_job(chat_id, seq, job, args)
+            return
+        await self._task_queue.put((chat_id, seq, job, args))
+
     async def start_command(self, update: Update, context):
         """Обработчик команды /start"""
         try:
@@ -340,7 +577,7 @@ class MarketBot:
             telegram_username = user.username or "Нет username"
 
             # Проверяем, есть ли уже такой поставщик
-            existing_supplier = self.sheets_manager.get_supplier_by_telegram_id(telegram_user_id)
+            existing_supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, telegram_user_id)
 
             if existing_supplier:
                 await update.message.reply_text(
@@ -473,13 +710,26 @@ class MarketBot:
             await self.start_photo_recognition(update, context)
         elif query.data == 'my_products':
             logger.info(f"handle_callback: calling show_my_products")
+            context.user_data['products_page'] = 0
             try:
                 await self.show_my_products(update, context)
                 logger.info(f"handle_callback: show_my_products completed successfully")
             except Exception as e:
-                logger.error(f"handle_callback: error in show_my_products: {e}")
-                import traceback
-                logger.error(f"handle_callback: traceback: {traceback.format_exc()}")
+                logger.exception(f"handle_callback: error in show_my_products: {e}")
+        elif query.data.startswith('products_page_'):
+            logger.info(f"handle_callback: calling show_my_products (pagination)")
+            try:
+                context.user_data['products_page'] = int(query.data.replace('products_page_', ''))
+            except ValueError:
+                context.user_data['products_page'] = 0
+            try:
+                await self.show_my_products(update, context)
+                logger.info(f"handle_callback: show_my_products (pagination) completed successfully")
+            except Exception as e:
+                logger.exception(f"handle_callback: error in show_my_products (pagination): {e}")
+        elif query.data == 'noop':
+            # Информационная кнопка (номер страницы) - query.answer() уже вызван выше
+            pass
         elif query.data == 'my_locations':
             logger.info(f"handle_callback: calling show_my_locations")
             await self.show_my_locations(update, context)
@@ -643,7 +893,7 @@ class MarketBot:
             telegram_username = user.username or "Нет username"
 
             # Проверяем, существует ли уже поставщик
-            existing_supplier = self.sheets_manager.get_supplier_by_telegram_id(telegram_user_id)
+            existing_supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, telegram_user_id)
 
             if existing_supplier:
                 # Используем существующего поставщика
@@ -653,7 +903,8 @@ class MarketBot:
                 # Создаем нового поставщика только если его нет
                 internal_id = str(uuid.uuid4())
                 logger.info(f"Creating new supplier with internal_id: {internal_id}")
-                self.sheets_manager.add_supplier(
+                await self._sheets(
+                    self.sheets_manager.add_supplier,
                     internal_id=internal_id,
                     telegram_user_id=telegram_user_id,
                     telegram_username=telegram_username,
@@ -665,7 +916,8 @@ class MarketBot:
 
             # Сохраняем локацию
             contact_phones_str = ", ".join(context.user_data['contact_phones'])
-            self.sheets_manager.add_location(
+            await self._sheets(
+                self.sheets_manager.add_location,
                 location_id=location_id,
                 supplier_internal_id=internal_id,
                 market_name=context.user_data['market_name'],
@@ -804,7 +1056,7 @@ class MarketBot:
             user = update.effective_user
             telegram_user_id = user.id
 
-            supplier = self.sheets_manager.get_supplier_by_telegram_id(telegram_user_id)
+            supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, telegram_user_id)
 
             if supplier:
                 # Ищем все локации для этого telegram_user_id (включая от старых регистраций)
@@ -812,7 +1064,7 @@ class MarketBot:
                 telegram_user_id = supplier['telegram_user_id']
 
                 # Сначала получаем все supplier_id для этого пользователя (используем кеш)
-                all_suppliers = self.sheets_manager.get_all_suppliers()
+                all_suppliers = await self._sheets(self.sheets_manager.get_all_suppliers)
                 user_supplier_ids = []
 
                 for supp_record in all_suppliers:
@@ -821,15 +1073,18 @@ class MarketBot:
                         user_supplier_ids.append(supp_record.get("internal_id"))
 
                 # Теперь получаем все локации для всех supplier_id этого пользователя
-                for supp_id in user_supplier_ids:
-                    locations = self.sheets_manager.get_locations_by_supplier_id(supp_id)
+                locations_per_supplier = await asyncio.gather(*(
+                    self._sheets(self.sheets_manager.get_locations_by_supplier_id, supp_id)
+                    for supp_id in user_supplier_ids
+                ))
+                for locations in locations_per_supplier:
                     all_locations.extend(locations)
 
                 locations = all_locations
 
                 # Экранируем специальные символы Markdown
-                contact_name = str(supplier['contact_name']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-                telegram_username = str(supplier['telegram_username']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
+                contact_name = md_escape(supplier['contact_name'])
+                telegram_username = md_escape(supplier['telegram_username'])
                 internal_id = str(supplier['internal_id'])
 
                 profile_text = (
@@ -845,9 +1100,9 @@ class MarketBot:
 
                 for i, location in enumerate(locations, 1):
                     # Экранируем специальные символы в данных локации
-                    market_name = str(location['market_name']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-                    pavilion_number = str(location['pavilion_number']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-                    contact_phones = str(location['contact_phones']).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
+                    market_name = md_escape(location['market_name'])
+                    pavilion_number = md_escape(location['pavilion_number'])
+                    contact_phones = md_escape(location['contact_phones'])
 
                     profile_text += (
                         f"\n*Точка {i}:*\n"
@@ -893,14 +1148,14 @@ class MarketBot:
         user = update.effective_user
         telegram_user_id = user.id
 
-        supplier = self.sheets_manager.get_supplier_by_telegram_id(telegram_user_id)
+        supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, telegram_user_id)
         if not supplier:
             await query.edit_message_text("❌ Ошибка: поставщик не найден")
             return
 
         # Находим все локации пользователя (используем кеш)
         all_locations = []
-        all_suppliers = self.sheets_manager.get_all_suppliers()
+        all_suppliers = await self._sheets(self.sheets_manager.get_all_suppliers)
         user_supplier_ids = []
 
         for supp_record in all_suppliers:
@@ -908,8 +1163,11 @@ class MarketBot:
             if user_id_field == telegram_user_id or str(user_id_field) == str(telegram_user_id):
                 user_supplier_ids.append(supp_record.get("internal_id"))
 
-        for supp_id in user_supplier_ids:
-            locations = self.sheets_manager.get_locations_by_supplier_id(supp_id)
+        locations_per_supplier = await asyncio.gather(*(
+            self._sheets(self.sheets_manager.get_locations_by_supplier_id, supp_id)
+            for supp_id in user_supplier_ids
+        ))
+        for locations in locations_per_supplier:
             all_locations.extend(locations)
 
         # Ищем нужную локацию
@@ -993,7 +1251,8 @@ class MarketBot:
             channel_id = context.user_data.get('editing_channel_id')
             if channel_id:
                 # Сохраняем пустое описание
-                success = self.sheets_manager.update_channel(
+                success = await self._sheets(
+                    self.sheets_manager.update_channel,
                     channel_id=channel_id,
                     description=""
                 )
@@ -1024,7 +1283,7 @@ class MarketBot:
         location_id = query.data.replace('confirm_delete_', '')
 
         try:
-            if self.sheets_manager.delete_location(location_id):
+            if await self._sheets(self.sheets_manager.delete_location, location_id):
                 await query.edit_message_text(
                     "✅ *Локация успешно удалена!*\n\n"
                     "Используйте /profile для просмотра обновленного списка.",
@@ -1245,7 +1504,8 @@ class MarketBot:
                 return
 
             # Обновляем локацию
-            success = self.sheets_manager.update_location(
+            success = await self._sheets(
+                self.sheets_manager.update_location,
                 location_id=location_id,
                 market_name=market_name,
                 pavilion_number=pavilion_number,
@@ -1283,7 +1543,8 @@ class MarketBot:
         logger.info(f"Updating market name for location_id: {location_id} to: {new_market_name}")
 
         # Обновляем только название рынка, не трогая остальные данные
-        success = self.sheets_manager.update_location(
+        success = await self._sheets(
+            self.sheets_manager.update_location,
             location_id=location_id,
             market_name=new_market_name  # Обновляем только рынок
         )
@@ -1317,7 +1578,8 @@ class MarketBot:
         logger.info(f"Updating pavilion for location_id: {location_id} to: {new_pavilion}")
 
         # Обновляем только павильон, не трогая остальные данные
-        success = self.sheets_manager.update_location(
+        success = await self._sheets(
+            self.sheets_manager.update_location,
             location_id=location_id,
             pavilion_number=new_pavilion  # Обновляем только павильон
         )
@@ -1371,10 +1633,7 @@ class MarketBot:
 
             # Загружаем фото
             photo = update.message.photo[-1]  # Берем фото наивысшего качества
-            file = await context.bot.get_file(photo.file_id)
-
-            # Получаем прямой URL на файл Telegram
-            bot_token = self.application.bot.token
+            file = await self._get_tg_file(context.bot, photo.file_id)
 
             # Telegram API изменился - теперь file_path может возвращать полный URL
             # Нужно извлечь только относительный путь
@@ -1382,33 +1641,22 @@ class MarketBot:
 
             logger.info(f"Original file_path: {file_path}")
 
-            # Если file_path содержит полный URL, извлекаем только путь
-            if file_path.startswith('http'):
-                # Извлекаем путь после /file/bot{token}/
-                if f'/file/bot{bot_token}/' in file_path:
-                    relative_path = file_path.split(f'/file/bot{bot_token}/')[-1]
-
-                    # Дополнительная проверка на случай дублирования URL
-                    if relative_path.startswith('http'):
-                        # Если остался дублирование, берем только последнюю часть пути
-                        relative_path = '/'.join(relative_path.split('/')[-2:])  # photos/file_X.jpg
-
-                    telegram_file_url = f"https://api.telegram.org/file/bot{bot_token}/{relative_path}"
-                else:
-                    # Если формат другой, пробуем извлечь после последнего /
-                    telegram_file_url = file_path
+            # Если file_path содержит полный URL (возможно, продублированный), извлекаем только путь
+            match = _TG_FILE_URL_RE.match(file_path)
+            if match:
+                telegram_file_url = _TG_FILE_URL_PREFIX + match.group(1)
+            elif file_path.startswith('http'):
+                # Если формат другой, используем URL как есть
+                telegram_file_url = file_path
             else:
                 # Если file_path только относительный путь, используем как есть
-                telegram_file_url = f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
+                telegram_file_url = _TG_FILE_URL_PREFIX + file_path
 
             logger.info(f"Final Telegram URL: {telegram_file_url}")
 
-            # Скачиваем фото в память для Gemini
-            photo_bytes = await file.download_as_bytearray()
-
-            # Добавляем фото в список
+            # Добавляем фото в список. Байты не храним в user_data -
+            # они скачиваются по file_id только на время распознавания
             photos.append({
-                'bytes': photo_bytes,
                 'file_id': photo.file_id,
                 'file_path': file.file_path,
                 'telegram_url': telegram_file_url,
@@ -1448,7 +1696,7 @@ class MarketBot:
                 return
 
             # Формируем сообщение с результатами
-            message = "🖼️ *Результаты распознавания:*\n\n"
+            parts = ["🖼️ *Результаты распознавания:*\n\n"]
 
             for i, result in enumerate(recognition_results, 1):
                 # Проверяем, новая ли JSON-структура или старая
@@ -1460,7 +1708,7 @@ class MarketBot:
                     # Показываем улучшенное описание, если есть
                     if result.get('generated_description'):
                         description = result['generated_description']
-                        message += "✨ *Улучшенное описание:*\n"
+                        parts.append("✨ *Улучшенное описание:*\n")
 
                     # Собираем дополнительную информацию
                     details = []
@@ -1476,24 +1724,26 @@ class MarketBot:
                     if marketing_text:
                         details.append(f"🎯 {marketing_text}")
 
-                    message += f"📷 *Товар {i}: {title}*\n"
-                    message += f"📝 {description}\n"
+                    parts.append(f"📷 *Товар {i}: {title}*\n")
+                    parts.append(f"📝 {description}\n")
                     if details:
-                        message += f"🏷️ {' | '.join(details)}\n"
+                        parts.append(f"🏷️ {' | '.join(details)}\n")
 
                     # Показываем статус улучшения изображения
                     if result.get('has_enhanced_image'):
-                        message += "🖼️ *Изображение улучшено*\n"
+                        parts.append("🖼️ *Изображение улучшено*\n")
                 else:
                     # Старая структура (обратная совместимость)
                     short_desc = result.get('short_description', 'Неизвестный товар')
                     full_desc = result.get('full_description', 'Нет описания')
 
-                    message += f"📷 *Товар {i}*\n"
-                    message += f"🏷️ *Кратко:* {short_desc}\n"
-                    message += f"📝 *Подробно:* {full_desc[:200]}{'...' if len(full_desc) > 200 else ''}\n"
+                    parts.append(f"📷 *Товар {i}*\n")
+                    parts.append(f"🏷️ *Кратко:* {short_desc}\n")
+                    parts.append(f"📝 *Подробно:* {full_desc[:200]}{'...' if len(full_desc) > 200 else ''}\n")
+
+                parts.append("\n")
 
-                message += "\n"
+            message = "".join(parts)
 
             # Создаем клавиатуру
             keyboard = [
@@ -1572,7 +1822,7 @@ class MarketBot:
             logger.info(f"ENABLE_CONTENT_GENERATION: {ENABLE_CONTENT_GENERATION}")
             logger.info(f"content_generation_service available: {self.content_generation_service is not None}")
 
-            supplier = self.sheets_manager.get_supplier_by_telegram_id(user_id)
+            supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, user_id)
             logger.info(f"Supplier found: {supplier is not None}")
 
             if not supplier:
@@ -1586,11 +1836,15 @@ class MarketBot:
             supplier_id = supplier['internal_id']
             logger.info(f"Supplier ID: {supplier_id}")
 
-            # Очищаем кэш перед получением товаров, чтобы получить актуальные данные
-            self.sheets_manager.invalidate_cache("products")
+            page = int(context.user_data.get('products_page', 0))
 
-            products = self.sheets_manager.get_products_by_supplier_id(supplier_id)
-            logger.info(f"Products returned: {products}, type: {type(products)}, length: {len(products) if products else 'N/A'}")
+            # Очищаем кэш при открытии списка, чтобы получить актуальные данные.
+            # При листании страниц используем кэш, чтобы не читать таблицу заново
+            if page == 0:
+                self.sheets_manager.invalidate_cache("products")
+
+            products = await self._sheets(self.sheets_manager.get_product_cards_by_supplier_id, supplier_id)
+            logger.info(f"Products returned: {len(products) if products else 0}")
 
             if not products:
                 logger.info(f"No products found for supplier {supplier_id}")
@@ -1602,254 +1856,251 @@ class MarketBot:
                 )
                 return
 
+            # Показываем только одну страницу, чтобы не отправлять сотни сообщений подряд
+            total_pages = (len(products) + PRODUCTS_PAGE_SIZE - 1) // PRODUCTS_PAGE_SIZE
+            page = max(0, min(page, total_pages - 1))
+            context.user_data['products_page'] = page
+            start = page * PRODUCTS_PAGE_SIZE
+            page_products = products[start:start + PRODUCTS_PAGE_SIZE]
+
             # Сначала редактируем текущее сообщение на заголовок
             await self.safe_edit_message_text(
                 query,
-                f"Мои товары 📦 ({len(products)} шт.)\n\n"
+                f"Мои товары 📦 ({len(products)} шт.)\n"
+                f"Страница {page + 1} из {total_pages}\n\n"
                 "Загружаю изображения...",
                 reply_markup=InlineKeyboardMarkup([[
                     InlineKeyboardButton("⬅️ Назад", callback_data="back_to_profile")
                 ]])
             )
 
-            # Отправляем каждый товар отдельным сообщением с фото
-            keyboard = []
-            for i, product in enumerate(products, 1):
-                try:
-                    # Безопасное получение данных с обработкой ошибок
-                    product_id = str(product.get('product_id', f'unknown_{i}'))
-
-                    # Используем новые поля из Google Sheets
-                    product_name = str(product.get('название', product.get('name', 'Без названия')))
-
-                    # Проверяем описание и полное описание (улучшенное)
-                    description_field = product.get('описание', product.get('description', ''))
-                    full_description_field = product.get('full_description', '')
-                    enhanced_description_field = product.get('enhanced_description', '')
-
-                    # Приоритет: улучшенное описание AI > полное описание > базовое описание
-                    if enhanced_description_field and str(enhanced_description_field).strip() and str(enhanced_description_field) != 'None':
-                        description_field = str(enhanced_description_field)
-                    elif full_description_field and str(full_description_field).strip() and str(full_description_field) != 'None':
-                        description_field = str(full_description_field)
-                    elif description_field and str(description_field).strip() and str(description_field) != 'None':
-                        description_field = str(description_field)
-                    else:
-                        description_field = ''
-
-                    # Если название пустое, пробуем извлечь из описания
-                    if product_name == 'Без названия' or not product_name.strip():
-                        product_name = self.extract_product_name(description_field)
-
-                    # Формируем краткое описание с безопасной обработкой
-                    if description_field and description_field.strip():
-                        short_desc = description_field
-                        # Ограничиваем длину
-                        if len(short_desc) > 150:
-                            short_desc = short_desc[:147] + "..."
-                    else:
-                        # Безопасно вызываем extract_short_description с пустой строкой
-                        short_desc = self.extract_short_description('', 80)
-
-                    # Безопасная обработка quantity
-                    quantity = product.get('quantity', '0')
-                    if quantity is None or quantity == '':
-                        quantity_str = '0'
-                    else:
-                        quantity_str = str(quantity)
+            # Отправка карточек товаров выполняется фоновым воркером,
+            # чтобы обработчик callback сразу освобождался
+            await self.enqueue_background_job(
+                user_id, self._send_products_page,
+                context, user_id, page_products, start, page, total_pages, len(products)
+            )
 
-                    created_at = str(product.get('created_at', ''))
+        except Exception as e:
+            logger.exception(f"Error in show_my_products: {e}")
+            logger.error(f"User ID: {user_id}")
+            logger.error(f"Supplier ID: {supplier_id}")
+            logger.error(f"Products count: {len(products) if products else 0}")
 
-                    # Приоритет: улучшенное изображение > оригинальное
-                    enhanced_image_url = product.get('enhanced_image_url', '')
-                    photo_url = product.get('photo_urls', '')
+            try:
+                if hasattr(update, 'callback_query') and update.callback_query:
+                    await self.safe_edit_message_text(
+                        update.callback_query,
+                        "❌ Ошибка при загрузке товаров. Попробуйте еще раз позже."
+                    )
+                else:
+                    await update.message.reply_text(
+                        "❌ Ошибка при загрузке товаров. Попробуйте еще раз позже."
+                    )
+            except Exception as fallback_error:
+                logger.error(f"Error in fallback message: {fallback_error}")
 
-                    # Проверяем, есть ли локальное улучшенное изображение
-                    enhanced_local_path = None
-                    if enhanced_image_url and str(enhanced_image_url).startswith('local:'):
-                        # Извлекаем имя файла из "local:filename"
-                        filename = str(enhanced_image_url).replace('local:', '')
-                        enhanced_local_path = f"{LOCAL_ENHANCED_IMAGES_PATH}/{filename}"
-                        # Проверяем существование файла
-                        import os
-                        if not os.path.exists(enhanced_local_path):
-                            logger.warning(f"Enhanced image file not found: {enhanced_local_path}")
-                            enhanced_local_path = None
-
-                    # Формируем описание товара с новой структурой
-                    caption = f"🏷️ {escape_markdown(product_name)}\n"
-
-                    # Добавляем индикаторы улучшенного контента
-                    has_enhanced_content = False
-                    if product.get('enhanced_description') and str(product.get('enhanced_description')).strip():
-                        caption += "✨ "
-                        has_enhanced_content = True
-                    caption += f"📝 {escape_markdown(short_desc)}\n"
-
-                    caption += f"🆔 ID: {product_id}\n"
-                    caption += f"📊 Количество: {quantity_str}\n"
-                    if created_at and created_at.strip():
-                        caption += f"📅 Добавлен: {created_at}\n"
-
-                    # Показываем, если есть улучшенный контент
-                    if has_enhanced_content:
-                        caption += f"🎨 *Есть улучшенный контент*\n"
-
-                    # Кнопки управления для товара
-                    product_buttons = []
-
-                    # Добавляем кнопку улучшения контента если доступна генерация
-                    logger.info(f"Проверка кнопки для товара {product_id}: ENABLE_CONTENT_GENERATION={ENABLE_CONTENT_GENERATION}, content_generation_service={self.content_generation_service is not None}")
-                    if ENABLE_CONTENT_GENERATION and self.content_generation_service:
-                        # Проверяем, доступна ли генерация для этого товара
-                        try:
-                            limit_check = self.content_generation_service.usage_limits.check_daily_limit(
-                                user_id, product_id, 'content_enhancement'
+    async def _send_products_page(self, context, user_id, page_products, start, page, total_pages, total_count):
+        """Отправка карточек товаров одной страницы и навигации (выполняется фоновым воркером)"""
+        # Отправляем каждый товар отдельным сообщением с фото
+        for i, product in enumerate(page_products, start + 1):
+            try:
+                # Карточка уже содержит подготовленные строки (см. ProductCard)
+                product_id = product.product_id or f'unknown_{i}'
+
+                # Если название пустое, пробуем извлечь из описания
+                product_name = product.name or self.extract_product_name(product.description)
+                short_desc = product.short_desc
+
+                quantity_str = product.quantity
+                created_at = product.created_at
+
+                # Приоритет: улучшенное изображение > оригинальное
+                enhanced_image_url = product.enhanced_image_url
+                photo_url = product.photo_url
+
+                # Проверяем, есть ли локальное улучшенное изображение
+                enhanced_local_path = None
+                if enhanced_image_url and str(enhanced_image_url).startswith('local:'):
+                    # Извлекаем имя файла из "local:filename"
+                    filename = str(enhanced_image_url).replace('local:', '')
+                    enhanced_local_path = f"{LOCAL_ENHANCED_IMAGES_PATH}/{filename}"
+                    # Проверяем существование файла
+                    import os
+                    if not os.path.exists(enhanced_local_path):
+                        logger.warning(f"Enhanced image file not found: {enhanced_local_path}")
+                        enhanced_local_path = None
+
+                # Формируем описание товара с новой структурой
+                caption = f"🏷️ {escape_markdown(product_name)}\n"
+
+                # Добавляем индикаторы улучшенного контента
+                has_enhanced_content = product.has_enhanced_content
+                if has_enhanced_content:
+                    caption += "✨ "
+                caption += f"📝 {escape_markdown(short_desc)}\n"
+
+                caption += f"🆔 ID: {product_id}\n"
+                caption += f"📊 Количество: {quantity_str}\n"
+                if created_at:
+                    caption += f"📅 Добавлен: {created_at}\n"
+
+                # Показываем, если есть улучшенный контент
+                if has_enhanced_content:
+                    caption += f"🎨 *Есть улучшенный контент*\n"
+
+                # Кнопки управления для товара
+                product_buttons = []
+
+                # Добавляем кнопку улучшения контента если доступна генерация
+                logger.info(f"Проверка кнопки для товара {product_id}: ENABLE_CONTENT_GENERATION={ENABLE_CONTENT_GENERATION}, content_generation_service={self.content_generation_service is not None}")
+                if ENABLE_CONTENT_GENERATION and self.content_generation_service:
+                    # Проверяем, доступна ли генерация для этого товара
+                    try:
+                        limit_check = await asyncio.to_thread(
+                            self.content_generation_service.usage_limits.check_daily_limit,
+                            user_id, product_id, 'content_enhancement', include_message=False
+                        )
+                        if limit_check['allowed']:
+                            product_buttons.append(
+                                InlineKeyboardButton(f"✨", callback_data=f"enhance_content_{product_id}")
                             )
-                            if limit_check['allowed']:
-                                product_buttons.append(
-                                    InlineKeyboardButton(f"✨", callback_data=f"enhance_content_{product_id}")
-                                )
-                            else:
-                                product_buttons.append(
-                                    InlineKeyboardButton(f"✨", callback_data=f"enhance_content_limit_{product_id}")
-                                )
-                        except Exception as e:
-                            logger.warning(f"Error checking content generation limits for {product_id}: {e}")
-
-                    # Кнопка просмотра улучшенного контента удалена
+                        else:
+                            product_buttons.append(
+                                InlineKeyboardButton(f"✨", callback_data=f"enhance_content_limit_{product_id}")
+                            )
+                    except Exception as e:
+                        logger.warning(f"Error checking content generation limits for {product_id}: {e}")
 
-                    # Добавляем стандартные кнопки (только удалить)
-                    product_buttons.append(
-                        InlineKeyboardButton(f"🗑️", callback_data=f"delete_product_{product_id}")
-                    )
+                # Кнопка просмотра улучшенного контента удалена
 
-                    try:
-                        product_markup = InlineKeyboardMarkup([product_buttons])
-
-                        # Приоритет отправки: локальное улучшенное > URL улучшенное > оригинальное
-                        if enhanced_local_path:
-                            # Отправляем улучшенное изображение из локального файла
-                            logger.info(f"Sending enhanced image from local file for product {product_id}: {enhanced_local_path}")
-                            with open(enhanced_local_path, 'rb') as photo_file:
-                                await context.bot.send_photo(
-                                    chat_id=user_id,
-                                    photo=photo_file,
-                                    caption=caption + "\n\n✨ Улучшенное изображение",
-                                    reply_markup=product_markup
-                                )
-                            logger.info(f"Enhanced image sent successfully for product {product_id}")
+                # Добавляем стандартные кнопки (только удалить)
+                product_buttons.append(
+                    InlineKeyboardButton(f"🗑️", callback_data=f"delete_product_{product_id}")
+                )
 
-                        elif enhanced_image_url and not str(enhanced_image_url).startswith('local:'):
-                            # Отправляем улучшенное изображение по URL
-                            logger.info(f"Sending enhanced image from URL for product {product_id}: {enhanced_image_url}")
-                            success = await self.send_photo_from_telegram_url(
+                try:
+                    product_markup = InlineKeyboardMarkup([product_buttons])
+
+                    # Приоритет отправки: локальное улучшенное > URL улучшенное > оригинальное
+                    if enhanced_local_path:
+                        # Отправляем улучшенное изображение из локального файла
+                        logger.info(f"Sending enhanced image from local file for product {product_id}: {enhanced_local_path}")
+                        with open(enhanced_local_path, 'rb') as photo_file:
+                            await self.send_with_flood_control(
+                                context.bot.send_photo,
                                 chat_id=user_id,
-                                photo_url=str(enhanced_image_url),
+                                photo=photo_file,
                                 caption=caption + "\n\n✨ Улучшенное изображение",
                                 reply_markup=product_markup
                             )
-                            if not success:
-                                # Fallback на оригинальное фото
-                                logger.warning(f"Failed to send enhanced image, using original")
-                                if photo_url:
-                                    await self.send_photo_from_telegram_url(
-                                        chat_id=user_id,
-                                        photo_url=str(photo_url),
-                                        caption=caption,
-                                        reply_markup=product_markup
-                                    )
-
-                        elif photo_url:
-                            # Отправляем оригинальное фото
-                            photo_url_str = str(photo_url) if photo_url else ""
-                            if photo_url_str.strip() and not photo_url_str.isdigit():
-                                logger.info(f"Sending original photo for product {product_id}: {photo_url_str}")
+                        logger.info(f"Enhanced image sent successfully for product {product_id}")
 
-                                success = await self.send_photo_from_telegram_url(
+                    elif enhanced_image_url and not str(enhanced_image_url).startswith('local:'):
+                        # Отправляем улучшенное изображение по URL
+                        logger.info(f"Sending enhanced image from URL for product {product_id}: {enhanced_image_url}")
+                        success = await self.send_photo_from_telegram_url(
+                            chat_id=user_id,
+                            photo_url=str(enhanced_image_url),
+                            caption=caption + "\n\n✨ Улучшенное изображение",
+                            reply_markup=product_markup
+                        )
+                        if not success:
+                            # Fallback на оригинальное фото
+                            logger.warning(f"Failed to send enhanced image, using original")
+                            if photo_url:
+                                await self.send_photo_from_telegram_url(
                                     chat_id=user_id,
-                                    photo_url=photo_url_str,
+                                    photo_url=str(photo_url),
                                     caption=caption,
                                     reply_markup=product_markup
                                 )
 
-                                if not success:
-                                    # Если фото не отправилось, отправляем текст с ссылкой
-                                    logger.warning(f"Failed to send photo for product {product_id}")
-                                    caption += f"\n🖼️ Фото: {photo_url_str}"
-                                    await context.bot.send_message(
-                                        chat_id=user_id,
-                                        text=caption,
-                                        reply_markup=product_markup
-                                    )
-                            else:
-                                # Если нет фото URL, отправляем только текст
-                                await context.bot.send_message(
+                    elif photo_url:
+                        # Отправляем оригинальное фото
+                        photo_url_str = str(photo_url) if photo_url else ""
+                        if photo_url_str and _URL_RE.match(photo_url_str):
+                            logger.info(f"Sending original photo for product {product_id}: {photo_url_str}")
+
+                            success = await self.send_photo_from_telegram_url(
+                                chat_id=user_id,
+                                photo_url=photo_url_str,
+                                caption=caption,
+                                reply_markup=product_markup
+                            )
+
+                            if not success:
+                                # Если фото не отправилось, отправляем текст с ссылкой
+                                logger.warning(f"Failed to send photo for product {product_id}")
+                                caption += f"\n🖼️ Фото: {photo_url_str}"
+                                await self.send_with_flood_control(
+                                    context.bot.send_message,
                                     chat_id=user_id,
                                     text=caption,
                                     reply_markup=product_markup
                                 )
                         else:
-                            # Если нет фото вообще, отправляем только текст
-                            await context.bot.send_message(
+                            # Если нет фото URL, отправляем только текст
+                            await self.send_with_flood_control(
+                                context.bot.send_message,
                                 chat_id=user_id,
                                 text=caption,
                                 reply_markup=product_markup
                             )
-
-                    except Exception as send_error:
-                        logger.error(f"Error sending product {i}: {send_error}")
-                        # В случае ошибки отправляем простое текстовое сообщение
-                        error_text = f"❌ Товар {i}: {short_desc}\nОшибка при отображении"
-                        await context.bot.send_message(
+                    else:
+                        # Если нет фото вообще, отправляем только текст
+                        await self.send_with_flood_control(
+                            context.bot.send_message,
                             chat_id=user_id,
-                            text=error_text
+                            text=caption,
+                            reply_markup=product_markup
                         )
 
-                except Exception as product_error:
-                    logger.error(f"Error processing product {i}: {product_error}")
-                    # Отправляем сообщение об ошибке для этого товара
-                    await context.bot.send_message(
+                except Exception as send_error:
+                    logger.error(f"Error sending product {i}: {send_error}")
+                    # В случае ошибки отправляем простое текстовое сообщение
+                    error_text = f"❌ Товар {i}: {short_desc}\nОшибка при отображении"
+                    await self.send_with_flood_control(
+                        context.bot.send_message,
                         chat_id=user_id,
-                        text=f"❌ Товар {i}: Ошибка при обработке данных"
+                        text=error_text
                     )
 
-            # Отправляем финальное сообщение с общей статистикой
-            summary_message = f"✅ Все товары загружены\n\n"
-            summary_message += f"📊 Всего товаров: {len(products)}\n"
-            summary_message += f"Используйте кнопки управления под каждым товаром"
-
-            # Кнопка возврата в конце
-            final_keyboard = InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Назад в профиль", callback_data="back_to_profile")
-            ]])
-
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=summary_message,
-                reply_markup=final_keyboard
-            )
-
-        except Exception as e:
-            logger.error(f"Error in show_my_products: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            logger.error(f"User ID: {user_id}")
-            logger.error(f"Supplier ID: {supplier_id}")
-            logger.error(f"Products count: {len(products) if products else 0}")
+            except Exception as product_error:
+                logger.error(f"Error processing product {i}: {product_error}")
+                # Отправляем сообщение об ошибке для этого товара
+                await self.send_with_flood_control(
+                    context.bot.send_message,
+                    chat_id=user_id,
+                    text=f"❌ Товар {i}: Ошибка при обработке данных"
+                )
 
-            try:
-                if hasattr(update, 'callback_query') and update.callback_query:
-                    await self.safe_edit_message_text(
-                        update.callback_query,
-                        "❌ Ошибка при загрузке товаров. Попробуйте еще раз позже."
-                    )
-                else:
-                    await update.message.reply_text(
-                        "❌ Ошибка при загрузке товаров. Попробуйте еще раз позже."
-                    )
-            except Exception as fallback_error:
-                logger.error(f"Error in fallback message: {fallback_error}")
+        # Отправляем финальное сообщение с общей статистикой
+        summary_message = f"✅ Товары {start + 1}-{start + len(page_products)} загружены\n\n"
+        summary_message += f"📊 Всего товаров: {total_count}\n"
+        summary_message += f"Используйте кнопки управления под каждым товаром"
+
+        # Навигация по страницам и кнопка возврата в конце
+        final_buttons = []
+        if total_pages > 1:
+            navigation_row = []
+            if page > 0:
+                navigation_row.append(InlineKeyboardButton("⬅️", callback_data=f"products_page_{page - 1}"))
+            navigation_row.append(InlineKeyboardButton(f"{page + 1}/{total_pages}", callback_data="noop"))
+            if page < total_pages - 1:
+                navigation_row.append(InlineKeyboardButton("➡️", callback_data=f"products_page_{page + 1}"))
+            final_buttons.append(navigation_row)
+        final_buttons.append([
+            InlineKeyboardButton("⬅️ Назад в профиль", callback_data="back_to_profile")
+        ])
+        final_keyboard = InlineKeyboardMarkup(final_buttons)
+
+        await self.send_with_flood_control(
+            context.bot.send_message,
+            chat_id=user_id,
+            text=summary_message,
+            reply_markup=final_keyboard
+        )
 
     async def confirm_photo_recognition(self, update: Update, context):
         """Подтвердить результаты распознавания"""
@@ -1867,12 +2118,12 @@ class MarketBot:
             # Получаем локации пользователя
 
             user_id = query.from_user.id
-            supplier = self.sheets_manager.get_supplier_by_telegram_id(user_id)
+            supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, user_id)
             if not supplier:
                 await query.edit_message_text("❌ Поставщик не найден")
                 return
 
-            locations = self.sheets_manager.get_locations_by_supplier_id(supplier['internal_id'])
+            locations = await self._sheets(self.sheets_manager.get_locations_by_supplier_id, supplier['internal_id'])
 
             if not locations:
                 await query.edit_message_text(
@@ -1984,7 +2235,7 @@ class MarketBot:
             product_id = query.data.replace('edit_product_', '')
 
 
-            product = self.sheets_manager.get_product_by_id(product_id)
+            product = await self._sheets(self.sheets_manager.get_product_by_id, product_id)
             if not product:
                 await query.edit_message_text("❌ Товар не найден")
                 return
@@ -1992,8 +2243,8 @@ class MarketBot:
             user_id = query.from_user.id
 
             # Извлекаем реальное название и краткое описание
-            description = str(product.get('description', ''))
-            product_name = self.extract_product_name(description)
+            description = product['description']
+            product_name = product['name'] or self.extract_product_name(description)
             short_desc = self.extract_short_description(description, 120)
 
             # Формируем описание товара с новой структурой
@@ -2001,10 +2252,10 @@ class MarketBot:
             caption += f"🏷️ {product_name}\n"
             caption += f"📝 {escape_markdown(short_desc)}\n"
             caption += f"🆔 ID: {product_id}\n"
-            caption += f"📊 Количество: {product.get('quantity', 'Не указано')}\n"
+            caption += f"📊 Количество: {product['quantity']}\n"
 
-            created_at = product.get('created_at', '')
-            if created_at and created_at.strip():
+            created_at = product['created_at']
+            if created_at:
                 caption += f"📅 Добавлен: {created_at}\n"
 
             caption += f"\n\n🚧 ВНИМАНИЕ: Функция редактирования товара сейчас находится в разработке.\n"
@@ -2016,11 +2267,10 @@ class MarketBot:
             reply_markup = InlineKeyboardMarkup(keyboard)
 
             # Проверяем наличие фото
-            photo_url = product.get('photo_urls', '')
+            photo_url_str = product['photo_urls']
 
-            if photo_url:
-                photo_url_str = str(photo_url) if photo_url else ""
-                if photo_url_str.strip() and not photo_url_str.isdigit():
+            if photo_url_str:
+                if _URL_RE.match(photo_url_str):
                     logger.info(f"Sending photo for edit product {product_id}: {photo_url_str}")
 
                     # Сначала редактируем текущее сообщение на "Загружаю..."
@@ -2084,7 +2334,7 @@ class MarketBot:
             product_id = query.data.replace('delete_product_', '')
 
 
-            success = self.sheets_manager.delete_product(product_id)
+            success = await self._sheets(self.sheets_manager.delete_product, product_id)
 
             if success:
                 await self.safe_edit_message_text(
@@ -2144,7 +2394,7 @@ class MarketBot:
 
             # Распознаем фото
             recognition_results = []
-            photo_bytes_list = [photo['bytes'] for photo in uploaded_photos]
+            photo_bytes_list = await self._download_uploaded_photos(context, uploaded_photos)
 
             if self.gemini_service:
                 try:
@@ -2165,8 +2415,9 @@ class MarketBot:
                                 product_id = str(uuid.uuid4())  # Временный ID для товара
 
                                 # Проверяем лимиты
-                                limit_check = self.content_generation_service.usage_limits.check_daily_limit(
-                                    user_id, product_id, 'content_enhancement'
+                                limit_check = await asyncio.to_thread(
+                                    self.content_generation_service.usage_limits.check_daily_limit,
+                                    user_id, product_id, 'content_enhancement', include_message=False
                                 )
 
                                 if limit_check['allowed']:
@@ -2236,6 +2487,14 @@ class MarketBot:
             logger.error(f"Error in process_photo_recognition: {e}")
             await update.message.reply_text("❌ Ошибка при распознавании. Попробуйте позже.")
 
+    async def _download_uploaded_photos(self, context, uploaded_photos):
+        """Параллельно скачать байты загруженных фото по их file_id"""
+        async def download(photo):
+            file = await self._get_tg_file(context.bot, photo['file_id'])
+            return await file.download_as_bytearray()
+
+        return await asyncio.gather(*(download(photo) for photo in uploaded_photos))
+
     async def back_to_profile(self, update: Update, context):
         """Вернуться в профиль из callback"""
         try:
@@ -2244,17 +2503,17 @@ class MarketBot:
             user = query.from_user
             telegram_user_id = user.id
 
-            supplier = self.sheets_manager.get_supplier_by_telegram_id(telegram_user_id)
+            supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, telegram_user_id)
 
             if supplier:
                 # Формируем сообщение профиля
-                contact_name = str(supplier.get('contact_name', 'Не указано')).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-                market_name = str(supplier.get('market_name', 'Не указано')).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-                telegram_username = str(supplier.get('telegram_username', user.username or 'Нет username')).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
+                contact_name = md_escape(supplier.get('contact_name', 'Не указано'))
+                market_name = md_escape(supplier.get('market_name', 'Не указано'))
+                telegram_username = md_escape(supplier.get('telegram_username', user.username or 'Нет username'))
 
                 # Получаем количество товаров
                 supplier_id = supplier['internal_id']
-                products = self.sheets_manager.get_products_by_supplier_id(supplier_id)
+                products = await self._sheets(self.sheets_manager.get_products_by_supplier_id, supplier_id)
                 product_count = len(products) if products else 0
 
                 message = f"👤 *Личный кабинет поставщика*\n\n"
@@ -2265,13 +2524,13 @@ class MarketBot:
                 message += f"📦 *Товаров:* {product_count} шт.\n\n"
 
                 # Получаем все локации поставщика
-                locations = self.sheets_manager.get_locations_by_supplier_id(supplier_id)
+                locations = await self._sheets(self.sheets_manager.get_locations_by_supplier_id, supplier_id)
                 if locations:
                     message += "📍 *Ваши локации:*\n"
                     for i, loc in enumerate(locations[:3], 1):
-                        market = str(loc.get('market_name', 'Неизвестный рынок')).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-                        pavilion = str(loc.get('pavilion_number', 'Без номера')).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-                        phones = str(loc.get('contact_phones', '')).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
+                        market = md_escape(loc.get('market_name', 'Неизвестный рынок'))
+                        pavilion = md_escape(loc.get('pavilion_number', 'Без номера'))
+                        phones = md_escape(loc.get('contact_phones', ''))
                         message += f"  {i}. {market}, пав. {pavilion}"
                         if phones:
                             message += f" 📞 {phones}"
@@ -2304,9 +2563,7 @@ class MarketBot:
                 )
 
         except Exception as e:
-            logger.error(f"Error in back_to_profile: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception(f"Error in back_to_profile: {e}")
 
             # Fallback сообщение
             await update.callback_query.edit_message_text(
@@ -2339,17 +2596,14 @@ class MarketBot:
                 return
 
             # Парсим количества
-            quantities = []
+            products_count = len(recognition_results)
             if message_text.lower() == 'пропустить':
-                quantities = [1] * len(recognition_results)
+                quantities = [1] * products_count
             else:
                 try:
-                    quantities = [int(q.strip()) for q in message_text.split(',')]
-                    if len(quantities) != len(recognition_results):
-                        # Если количество не совпадает, добавляем или усекаем
-                        while len(quantities) < len(recognition_results):
-                            quantities.append(1)
-                        quantities = quantities[:len(recognition_results)]
+                    # Лишние значения отбрасываем, недостающие дополняем единицами
+                    quantities = [int(q) for q in message_text.split(',')[:products_count]]
+                    quantities.extend([1] * (products_count - len(quantities)))
                 except ValueError:
                     await update.message.reply_text(
                         "❌ Неверный формат. Введите количества через запятую или 'Пропустить'"
@@ -2372,7 +2626,7 @@ class MarketBot:
                 await self.initialize_services()
 
             user_id = update.effective_user.id
-            supplier = self.sheets_manager.get_supplier_by_telegram_id(user_id)
+            supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, user_id)
             if not supplier:
                 await update.message.reply_text("❌ Поставщик не найден")
                 return
@@ -2381,10 +2635,13 @@ class MarketBot:
             selected_location_id = context.user_data.get('selected_location_id')
             uploaded_photos = context.user_data.get('uploaded_photos', [])
 
-            saved_products = 0
+            products_to_save = []  # Строки для одного пакетного запроса к Sheets
             saved_product_data = []  # Сохраняем полные данные товаров для автоматической генерации
 
-            for i, (result, quantity) in enumerate(zip(recognition_results, quantities)):
+            # Фото выровнены с результатами распознавания; недостающие дополняются None
+            aligned_photos = chain(uploaded_photos, repeat(None))
+
+            for result, quantity, photo_data in zip(recognition_results, quantities, aligned_photos):
                 product_id = str(uuid.uuid4())
 
                 # Добавляем количество в данные товара
@@ -2395,14 +2652,11 @@ class MarketBot:
                 image_urls = ""
                 image_bytes = None
                 try:
-                    if i < len(uploaded_photos):
-                        photo_data = uploaded_photos[i]
-                        telegram_url = photo_data.get('telegram_url', '')
-                        if telegram_url:
-                            image_urls = telegram_url
-                            logger.info(f"Using Telegram URL for product {product_id}: {telegram_url}")
-                        # Сохраняем image_bytes для автоматической генерации
-                        image_bytes = photo_data.get('bytes')
+                    telegram_url = (photo_data or {}).get('telegram_url', '')
+                    if telegram_url:
+                        image_urls = telegram_url
+                        logger.info(f"Using Telegram URL for product {product_id}: {telegram_url}")
+                    # Байты фото не хранятся в user_data - автогенерация скачает их по URL
                 except Exception as e:
                     logger.warning(f"Failed to get Telegram URL for image: {e}")
 
@@ -2435,40 +2689,28 @@ class MarketBot:
                     product_data['enhanced_description'] = result['generated_description']
                 if result.get('marketing_text'):
                     product_data['marketing_text'] = result['marketing_text']
+                if enhanced_image_url or result.get('generated_description') or result.get('marketing_text'):
+                    product_data['content_generated_at'] = datetime.now().isoformat()
+
+                products_to_save.append({
+                    'product_id': product_id,
+                    'supplier_internal_id': supplier['internal_id'],
+                    'location_id': selected_location_id,
+                    'product_data': product_data,
+                    'image_urls': image_urls
+                })
+
+                # Сохраняем полные данные товара для автоматической генерации (только если еще не было улучшения)
+                if not result.get('has_enhanced_image') and not result.get('has_enhanced_description'):
+                    saved_product_data.append({
+                        'product_id': product_id,
+                        'product_info': product_data,
+                        'photo_urls': image_urls,
+                        'image_bytes': image_bytes
+                    })
 
-                # Сохраняем в Google Sheets с новой структурой
-                success = self.sheets_manager.add_product(
-                    product_id=product_id,
-                    supplier_internal_id=supplier['internal_id'],
-                    location_id=selected_location_id,
-                    product_data=product_data,
-                    image_urls=image_urls
-                )
-
-                # Если есть улучшенный контент, обновляем запись в Sheets
-                if success and (enhanced_image_url or result.get('generated_description') or result.get('marketing_text')):
-                    try:
-                        self.sheets_manager.update_product_enhanced_content(
-                            product_id=product_id,
-                            enhanced_image_url=enhanced_image_url,
-                            enhanced_description=result.get('generated_description'),
-                            marketing_text=result.get('marketing_text'),
-                            content_generated_at=datetime.now().isoformat()
-                        )
-                        logger.info(f"✅ Sheets updated with enhanced content for product {product_id}")
-                    except Exception as e:
-                        logger.error(f"Error updating enhanced content in sheets: {e}")
-
-                if success:
-                    saved_products += 1
-                    # Сохраняем полные данные товара для автоматической генерации (только если еще не было улучшения)
-                    if not result.get('has_enhanced_image') and not result.get('has_enhanced_description'):
-                        saved_product_data.append({
-                            'product_id': product_id,
-                            'product_info': product_data,
-                            'photo_urls': image_urls,
-                            'image_bytes': image_bytes
-                        })
+            # Сохраняем все товары (вместе с улучшенным контентом) одним запросом к Google Sheets
+            saved_products = len(await self._sheets(self.sheets_manager.add_products_bulk, products_to_save))
 
             # Очищаем контекст
             context.user_data.clear()
@@ -2516,62 +2758,73 @@ class MarketBot:
                 parse_mode='Markdown'
             )
 
-            enhanced_products = []
-            failed_products = []
+            # Товары обрабатываются параллельно, семафор ограничивает число
+            # одновременных запросов к Gemini/Drive
+            semaphore = asyncio.Semaphore(AUTO_GENERATION_CONCURRENCY)
 
-            for i, product_data_item in enumerate(products_data):
-                try:
-                    product_id = product_data_item['product_id']
-                    product = product_data_item['product_info']
-                    image_bytes = product_data_item.get('image_bytes')
+            async def process_one(i, product_data_item):
+                """Генерация контента для одного товара: (данные улучшенного товара, None) или (None, product_id)"""
+                product_id = product_data_item.get('product_id')
+                async with semaphore:
+                    try:
+                        product = product_data_item['product_info']
+                        image_bytes = product_data_item.get('image_bytes')
 
-                    logger.info(f"Processing product {i+1}/{len(products_data)}: {product_id}")
+                        logger.info(f"Processing product {i+1}/{len(products_data)}: {product_id}")
 
-                    # Если image_bytes не был передан, пытаемся скачать по URL
-                    if not image_bytes:
-                        photo_url = product_data_item.get('photo_urls', '')
-                        if photo_url:
+                        async def download_image():
+                            """Скачать фото по URL, если image_bytes не был передан"""
+                            photo_url = product_data_item.get('photo_urls', '')
+                            if image_bytes or not photo_url:
+                                return image_bytes
                             try:
-                                response = requests.get(photo_url, timeout=10)
-                                if response.status_code == 200:
-                                    image_bytes = response.content
+                                downloaded = await self.download_image(photo_url, timeout=10)
+                                if downloaded:
                                     logger.info(f"Downloaded image for product {product_id}")
+                                    return downloaded
                             except Exception as e:
                                 logger.warning(f"Failed to download image for {product_id}: {e}")
+                            return None
+
+                        # Проверка лимитов (синхронный запрос к Sheets - в отдельном потоке)
+                        # выполняется параллельно со скачиванием фото
+                        limit_check, image_bytes = await asyncio.gather(
+                            asyncio.to_thread(
+                                self.content_generation_service.usage_limits.check_daily_limit,
+                                user_id, product_id, 'content_enhancement', include_message=False
+                            ),
+                            download_image()
+                        )
 
-                    # Проверяем лимиты
-                    limit_check = self.content_generation_service.usage_limits.check_daily_limit(
-                        user_id, product_id, 'content_enhancement'
-                    )
+                        if not limit_check['allowed']:
+                            logger.info(f"Content generation limit reached for product {product_id}")
+                            return None, product_id
+
+                        # Запускаем генерацию контента (изображение + описание)
+                        result = await self.content_generation_service.enhance_product_content(
+                            product_info=product,
+                            product_image_bytes=image_bytes,
+                            generate_image=True,  # Включено улучшение фото через Gemini 2.5 Flash Image
+                            generate_description=True,
+                            generate_marketing=True
+                        )
 
-                    if not limit_check['allowed']:
-                        logger.info(f"Content generation limit reached for product {product_id}")
-                        failed_products.append(product_id)
-                        continue
-
-                    # Запускаем генерацию контента (изображение + описание)
-                    result = await self.content_generation_service.enhance_product_content(
-                        product_info=product,
-                        product_image_bytes=image_bytes,
-                        generate_image=True,  # Включено улучшение фото через Gemini 2.5 Flash Image
-                        generate_description=True,
-                        generate_marketing=True
-                    )
+                        # Проверяем, был ли сгенерирован контент
+                        has_generated_content = (
+                            result.get('generated_description') or
+                            result.get('marketing_text') or
+                            result.get('enhanced_image_bytes')
+                        )
 
-                    # Проверяем, был ли сгенерирован контент
-                    has_generated_content = (
-                        result.get('generated_description') or
-                        result.get('marketing_text') or
-                        result.get('enhanced_image_bytes')
-                    )
+                        if not has_generated_content:
+                            logger.warning(f"No content generated for product {product_id}")
+                            return None, product_id
 
-                    if has_generated_content:
                         enhanced_image_url = None
 
                         # Сохраняем улучшенное изображение на Drive
                         if result.get('enhanced_image_bytes'):
                             try:
-                                from datetime import datetime
                                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                                 filename = f"enhanced_{product_id}_{timestamp}.jpg"
 
@@ -2592,7 +2845,8 @@ class MarketBot:
 
                         # Обновляем Google Sheets с улучшенным контентом
                         try:
-                            self.sheets_manager.update_product_enhanced_content(
+                            await self._sheets(
+                                self.sheets_manager.update_product_enhanced_content,
                                 product_id=product_id,
                                 enhanced_image_url=enhanced_image_url,
                                 enhanced_description=result.get('generated_description'),
@@ -2603,22 +2857,38 @@ class MarketBot:
                         except Exception as e:
                             logger.error(f"Error updating Sheets: {e}")
 
-                        enhanced_products.append({
+                        logger.info(f"Successfully enhanced content for product {product_id}")
+                        return {
                             'product_id': product_id,
                             'product_name': product.get('название', 'Товар'),
                             'enhanced_description': result.get('generated_description'),
                             'marketing_text': result.get('marketing_text'),
                             'enhanced_image_url': enhanced_image_url,
                             'has_image': bool(enhanced_image_url)
-                        })
-                        logger.info(f"Successfully enhanced content for product {product_id}")
-                    else:
-                        logger.warning(f"No content generated for product {product_id}")
-                        failed_products.append(product_id)
+                        }, None
 
-                except Exception as e:
-                    logger.error(f"Error processing product {product_id}: {e}")
-                    failed_products.append(product_id)
+                    except Exception as e:
+                        logger.error(f"Error processing product {product_id}: {e}")
+                        return None, product_id
+
+            results = await asyncio.gather(
+                *(process_one(i, item) for i, item in enumerate(products_data)),
+                return_exceptions=True
+            )
+
+            enhanced_products = []
+            failed_products = []
+            for product_data_item, result in zip(products_data, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error processing product {product_data_item.get('product_id')}: {result}")
+                    failed_products.append(product_data_item.get('product_id'))
+                    continue
+
+                enhanced_product, failed_product_id = result
+                if enhanced_product:
+                    enhanced_products.append(enhanced_product)
+                else:
+                    failed_products.append(failed_product_id)
 
             # Отправляем результаты
             await self.send_content_generation_results(update, enhanced_products, failed_products, status_message)
@@ -2646,8 +2916,32 @@ class MarketBot:
 
                 await status_message.edit_text(status_text, parse_mode='Markdown')
 
-                # Показываем несколько примеров улучшенных товаров
-                sample_products = enhanced_products[:2]  # Показываем максимум 2 примера
+                # Показываем примеры улучшенных товаров
+                sample_products = enhanced_products[:ENHANCED_EXAMPLES_LIMIT]
+
+                # sendMediaGroup принимает от 2 до 10 элементов и только ссылки на изображения
+                if len(sample_products) > 1 and all(
+                    _URL_RE.match(product.get('enhanced_image_url') or '') for product in sample_products
+                ):
+                    media = [
+                        InputMediaPhoto(
+                            media=product['enhanced_image_url'],
+                            caption=self._build_enhanced_example_caption(product),
+                            parse_mode='Markdown'
+                        )
+                        for product in sample_products
+                    ]
+                    try:
+                        await self.send_with_flood_control(
+                            self.application.bot.send_media_group,
+                            chat_id=update.effective_user.id,
+                            media=media
+                        )
+                        return
+                    except Exception as e:
+                        # Например, Telegram не смог скачать одну из ссылок Drive -
+                        # отправляем примеры по одному, там есть загрузка файла и текстовый fallback
+                        logger.warning(f"Не удалось отправить альбом примеров, отправляем по одному: {e}")
 
                 for product in sample_products:
                     await self.show_enhanced_product_example(update, product)
@@ -2660,21 +2954,43 @@ class MarketBot:
         except Exception as e:
             logger.error(f"Error sending content generation results: {e}")
 
+    @staticmethod
+    def _build_enhanced_example_caption(enhanced_product: dict) -> str:
+        """Формирует подпись к примеру улучшенного товара"""
+        enhanced_description = enhanced_product.get('enhanced_description')
+
+        header = f"🎨 *Пример улучшенного товара*\n\n"
+        header += f"🏷️ {escape_markdown(enhanced_product['product_name'])}\n"
+        footer = f"\n💡 Чтобы управлять контентом для всех товаров, используйте /my_products"
+        description_title = "📝 *Новое B2B описание:*\n"
+
+        caption = header
+        if enhanced_description:
+            # Подпись к фото ограничена CAPTION_MAX_LENGTH единицами UTF-16 - сокращаем описание
+            # до экранирования, чтобы не обрезать разметку посередине
+            budget = CAPTION_MAX_LENGTH - utf16_len(header + footer + description_title) - 2
+            escaped = escape_markdown(enhanced_description)
+            if utf16_len(escaped) > budget:
+                # Экранирование посимвольное, поэтому режем по символам исходного текста
+                parts, length = [], 0
+                for char in enhanced_description:
+                    piece = escape_markdown(char)
+                    piece_length = utf16_len(piece)
+                    if length + piece_length > budget - 1:
+                        break
+                    parts.append(piece)
+                    length += piece_length
+                escaped = "".join(parts) + "…"
+            caption += f"{description_title}{escaped}\n"
+
+        caption += footer
+        return caption
+
     async def show_enhanced_product_example(self, update: Update, enhanced_product: dict):
         """Показывает пример улучшенного товара"""
         try:
-            product_id = enhanced_product['product_id']
-            product_name = enhanced_product['product_name']
             enhanced_image_url = enhanced_product.get('enhanced_image_url')
-            enhanced_description = enhanced_product.get('enhanced_description')
-
-            caption = f"🎨 *Пример улучшенного товара*\n\n"
-            caption += f"🏷️ {escape_markdown(product_name)}\n"
-
-            if enhanced_description:
-                caption += f"📝 *Новое B2B описание:*\n{escape_markdown(enhanced_description)}\n"
-
-            caption += f"\n💡 Чтобы управлять контентом для всех товаров, используйте /my_products"
+            caption = self._build_enhanced_example_caption(enhanced_product)
 
             keyboard = [[InlineKeyboardButton("📦", callback_data="my_products")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -2691,9 +3007,21 @@ class MarketBot:
                 if not success:
                     # Если не удалось, отправляем только текст
                     caption += f"\n🖼️ [Улучшенное изображение]({enhanced_image_url})"
-                    await update.message.reply_text(caption, parse_mode='Markdown', reply_markup=reply_markup)
+                    await self.send_with_flood_control(
+                        self.application.bot.send_message,
+                        chat_id=update.effective_chat.id,
+                        text=caption,
+                        parse_mode='Markdown',
+                        reply_markup=reply_markup
+                    )
             else:
-                await update.message.reply_text(caption, parse_mode='Markdown', reply_markup=reply_markup)
+                await self.send_with_flood_control(
+                    self.application.bot.send_message,
+                    chat_id=update.effective_chat.id,
+                    text=caption,
+                    parse_mode='Markdown',
+                    reply_markup=reply_markup
+                )
 
         except Exception as e:
             logger.error(f"Error showing enhanced product example: {e}")
@@ -2706,7 +3034,7 @@ class MarketBot:
 
 
             user_id = query.from_user.id
-            supplier = self.sheets_manager.get_supplier_by_telegram_id(user_id)
+            supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, user_id)
 
             if not supplier:
                 await query.edit_message_text(
@@ -2717,7 +3045,7 @@ class MarketBot:
             supplier_id = supplier['internal_id']
 
             # Получаем все локации этого поставщика
-            locations = self.sheets_manager.get_locations_by_supplier_id(supplier_id)
+            locations = await self._sheets(self.sheets_manager.get_locations_by_supplier_id, supplier_id)
 
             if not locations:
                 await query.edit_message_text(
@@ -2728,20 +3056,22 @@ class MarketBot:
                 )
                 return
 
-            # Формируем сообщение с локациями
-            message = f"📍 *Мои локации ({len(locations)} шт.):*\n\n"
+            # Формируем сообщение с локациями (строки собираются в список и склеиваются один раз)
+            parts = [f"📍 *Мои локации ({len(locations)} шт.):*", ""]
 
             for i, location in enumerate(locations, 1):
-                market_name = str(location.get('market_name', 'Неизвестный рынок')).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-                pavilion_number = str(location.get('pavilion_number', 'Без номера')).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
-                contact_phones = str(location.get('contact_phones', '')).replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
+                market_name = md_escape(location.get('market_name', 'Неизвестный рынок'))
+                pavilion_number = md_escape(location.get('pavilion_number', 'Без номера'))
+                contact_phones = md_escape(location.get('contact_phones', ''))
 
-                message += f"*🏪 Локация {i}*\n"
-                message += f"🏬 Рынок: {market_name}\n"
-                message += f"🏢 Павильон: {pavilion_number}\n"
+                parts.append(f"*🏪 Локация {i}*")
+                parts.append(f"🏬 Рынок: {market_name}")
+                parts.append(f"🏢 Павильон: {pavilion_number}")
                 if contact_phones:
-                    message += f"📞 Телефоны: {contact_phones}\n"
-                message += "\n"
+                    parts.append(f"📞 Телефоны: {contact_phones}")
+                parts.append("")
+
+            message = "\n".join(parts) + "\n"
 
             # Создаем клавиатуру с кнопками управления
             keyboard = [
@@ -2781,7 +3111,8 @@ class MarketBot:
             logger.info(f"Попытка улучшить товар с ID: '{product_id}' из callback_data: '{query.data}'")
 
             # Проверяем лимиты
-            limit_check = self.content_generation_service.usage_limits.check_daily_limit(
+            limit_check = await asyncio.to_thread(
+                self.content_generation_service.usage_limits.check_daily_limit,
                 user_id, product_id, 'content_enhancement'
             )
 
@@ -2796,7 +3127,7 @@ class MarketBot:
 
             # Получаем информацию о товаре
 
-            product = self.sheets_manager.get_product_by_id(product_id)
+            product = await self._sheets(self.sheets_manager.get_product_by_id, product_id)
 
             # Логирование для отладки
             logger.info(f"Результат поиска товара с ID '{product_id}': {'найден' if product else 'не найден'}")
@@ -2821,21 +3152,37 @@ class MarketBot:
             photo_url = product.get('photo_urls', '')
             if photo_url:
                 try:
-                    response = requests.get(photo_url, timeout=15)
-                    if response.status_code == 200:
-                        image_bytes = response.content
+                    image_bytes = await self.download_image(photo_url)
+                    if image_bytes:
                         logger.info(f"Downloaded image for product {product_id}")
                 except Exception as e:
                     logger.warning(f"Failed to download image for {product_id}: {e}")
 
-            # Запускаем генерацию контента (изображение + описание)
-            result = await self.content_generation_service.enhance_product_content(
-                product_info=product,
-                product_image_bytes=image_bytes,
-                generate_image=True,  # Включено улучшение фото через Gemini 2.5 Flash Image
-                generate_description=True,
-                generate_marketing=True
-            )
+            # Контент, сгенерированный для этого фото, но не сохраненный из-за сбоя
+            # загрузки в Drive или записи в Sheets, берем из кеша, не вызывая Gemini заново.
+            # Без исходного фото кеш не используется
+            enhancement_cache = get_enhancement_cache()
+            cache_key = make_cache_key(product_id, image_bytes) if image_bytes else None
+            result = None
+            if cache_key:
+                result = await asyncio.to_thread(enhancement_cache.get, cache_key)
+
+            if result is not None:
+                logger.info(f"Enhanced content for product {product_id} taken from cache")
+            else:
+                # Запускаем генерацию контента (изображение + описание)
+                result = await self.content_generation_service.enhance_product_content(
+                    product_info=product,
+                    product_image_bytes=image_bytes,
+                    generate_image=True,  # Включено улучшение фото через Gemini 2.5 Flash Image
+                    generate_description=True,
+                    generate_marketing=True
+                )
+
+                # Частичные результаты (например, fallback на оригинальное фото) не кешируем,
+                # чтобы повтор генерировал контент заново
+                if cache_key and is_complete_result(result):
+                    await asyncio.to_thread(enhancement_cache.set, cache_key, result)
 
             # Если есть улучшенное изображение - загружаем в Google Drive
             enhanced_image_path = None
@@ -2926,7 +3273,8 @@ class MarketBot:
                 if final_image_url or generated_description or marketing_text:
                     logger.info(f"Сохраняем улучшенный контент для товара {product_id}")
                     logger.info(f"Final image URL: {final_image_url}")
-                    self.sheets_manager.update_product_enhanced_content(
+                    saved = await self._sheets(
+                        self.sheets_manager.update_product_enhanced_content,
                         product_id=product_id,
                         enhanced_image_url=final_image_url,
                         enhanced_description=generated_description,
@@ -2935,7 +3283,13 @@ class MarketBot:
                     )
                     # Принудительно инвалидируем кеш чтобы изменения были видны сразу
                     self.sheets_manager.invalidate_cache("products")
-                    logger.info(f"✅ Улучшенный контент сохранен в Google Sheets")
+                    if saved:
+                        logger.info(f"✅ Улучшенный контент сохранен в Google Sheets")
+                        # Фото в Drive и запись в Sheets на месте - повтор из кеша больше не нужен
+                        if cache_key and (enhanced_image_url_for_sheets or not self.image_storage_service):
+                            await asyncio.to_thread(enhancement_cache.delete, cache_key)
+                    else:
+                        logger.error(f"Failed to save enhanced content to Google Sheets for product {product_id}")
             except Exception as e:
                 logger.error(f"Failed to save enhanced content to Google Sheets: {e}")
 
@@ -2972,7 +3326,8 @@ class MarketBot:
                 return
 
             # Получаем детальную информацию о лимитах
-            limit_check = self.content_generation_service.usage_limits.check_daily_limit(
+            limit_check = await asyncio.to_thread(
+                self.content_generation_service.usage_limits.check_daily_limit,
                 user_id, product_id, 'content_enhancement'
             )
 
@@ -3018,7 +3373,7 @@ class MarketBot:
             logger.info(f"Просмотр улучшенного контента для товара {product_id}")
 
             # Получаем информацию о поставщике
-            supplier = self.sheets_manager.get_supplier_by_telegram_id(user_id)
+            supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, user_id)
             if not supplier:
                 await self.safe_edit_message_text(
                     query,
@@ -3029,12 +3384,9 @@ class MarketBot:
             supplier_id = supplier['internal_id']
 
             # Получаем информацию о товаре
-            products = self.sheets_manager.get_products_by_supplier_id(supplier_id)
-            product = None
-            for p in products:
-                if str(p.get('product_id')) == str(product_id):
-                    product = p
-                    break
+            products = await self._sheets(self.sheets_manager.get_products_by_supplier_id, supplier_id)
+            product_id_str = str(product_id)
+            product = next((p for p in products if str(p.get('product_id')) == product_id_str), None)
 
             if not product:
                 await self.safe_edit_message_text(
@@ -3150,9 +3502,7 @@ class MarketBot:
                 )
 
         except Exception as e:
-            logger.error(f"Error in view_enhanced_content: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception(f"Error in view_enhanced_content: {e}")
             try:
                 query = update.callback_query
                 await self.safe_edit_message_text(
@@ -3166,15 +3516,21 @@ class MarketBot:
         """Показать результат улучшения контента"""
         try:
             query = update.callback_query
-            product_id = original_product.get('product_id', 'unknown')
+            product_id = original_product.get('product_id')
             product_name = original_product.get('название', 'Товар')
 
+            # Используем правильные поля из результата (читаем каждое один раз)
+            enhanced_image_path = result.get('enhanced_image_path')  # Локальный путь к улучшенному изображению
+            enhanced_image_bytes = result.get('enhanced_image_bytes')  # Байты улучшенного изображения
+            generated_description = result.get('generated_description')
+            marketing_text = result.get('marketing_text')
+
             # Проверяем, был ли сгенерирован контент
             has_generated_content = (
-                result.get('generated_description') or
-                result.get('marketing_text') or
-                result.get('enhanced_image_bytes') or
-                result.get('enhanced_image_path')
+                generated_description or
+                marketing_text or
+                enhanced_image_bytes or
+                enhanced_image_path
             )
 
             if not has_generated_content:
@@ -3194,23 +3550,17 @@ class MarketBot:
                 )
                 return
 
-            # Формируем сообщение об успешном улучшении
-            success_message = f"✅ *Контент успешно улучшен!*\n\n"
-            success_message += f"🏷️ {escape_markdown(product_name)}\n"
-
-            # Используем правильные поля из результата
-            enhanced_image_url = result.get('enhanced_image_url')
-            enhanced_image_path = result.get('enhanced_image_path')  # Локальный путь к улучшенному изображению
-            enhanced_image_bytes = result.get('enhanced_image_bytes')  # Байты улучшенного изображения
-            generated_description = result.get('generated_description')
-            marketing_text = result.get('marketing_text')
-            variations = result.get('variations', [])
+            # Формируем сообщение об успешном улучшении (части склеиваются один раз)
+            message_parts = [
+                "✅ *Контент успешно улучшен!*\n\n",
+                f"🏷️ {escape_markdown(product_name)}\n",
+            ]
 
             if generated_description:
-                success_message += f"\n📝 *Сгенерированное B2B описание:*\n{generated_description}\n"
+                message_parts.append(f"\n📝 *Сгенерированное B2B описание:*\n{generated_description}\n")
 
             if marketing_text:
-                success_message += f"\n📢 *Маркетинговый текст:*\n{marketing_text}\n"
+                message_parts.append(f"\n📢 *Маркетинговый текст:*\n{marketing_text}\n")
 
             # TODO: Временно убрано, так как эти поля не генерируются
             # if background_used:
@@ -3221,26 +3571,26 @@ class MarketBot:
             #         'minimalist_display': 'Минималистичное отображение'
             #     }
             #     bg_name = bg_names.get(background_used, background_used)
-            #     success_message += f"\n🎨 Использован фон: {bg_name}\n"
+            #     message_parts.append(f"\n🎨 Использован фон: {bg_name}\n")
 
             # if variations:
-            #     success_message += f"\n💡 Дополнительные варианты описания:\n"
+            #     message_parts.append(f"\n💡 Дополнительные варианты описания:\n")
             #     for i, variation in enumerate(variations[:2], 1):  # Показываем первые 2 варианта
-            #         success_message += f"{i}. {variation}\n"
+            #         message_parts.append(f"{i}. {variation}\n")
 
-            success_message += f"\n💎 Ваш товар теперь выглядит профессионально для B2B продаж!"
+            message_parts.append("\n💎 Ваш товар теперь выглядит профессионально для B2B продаж!")
 
             # Автоматически сохраняем улучшенный контент в Google Sheets
             try:
-                product_id = original_product.get('product_id')
                 if generated_description and product_id:
                     logger.info(f"Сохраняем улучшенное описание для товара {product_id}")
-                    success = self.sheets_manager.update_product(
+                    success = await self._sheets(
+                        self.sheets_manager.update_product,
                         product_id=product_id,
                         short_description=generated_description  # Сохраняем в колонку 'описание'
                     )
                     if success:
-                        success_message += f"\n✅ *Улучшенное описание автоматически сохранено!*"
+                        message_parts.append("\n✅ *Улучшенное описание автоматически сохранено!*")
                         logger.info(f"Улучшенное описание для товара {product_id} успешно сохранено")
                         # Принудительно инвалидируем кеш чтобы изменения были видны сразу
                         self.sheets_manager.invalidate_cache("products")
@@ -3252,11 +3602,18 @@ class MarketBot:
             except Exception as save_error:
                 logger.error(f"Ошибка при сохранении улучшенного описания: {save_error}")
 
+            success_message = "".join(message_parts)
+
             keyboard = [[InlineKeyboardButton("📦", callback_data="my_products")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
             # Если есть улучшенное изображение, показываем его
             if enhanced_image_bytes or enhanced_image_path:
+                image_caption = (
+                    f"🎨 *Улучшенное изображение для {escape_markdown(product_name)}*\n\n"
+                    f"✨ Профессиональная обработка через Gemini 2.5 Flash Image\n"
+                    f"📸 Студийное освещение и композиция для B2B продаж"
+                )
                 try:
                     # Редактируем текущее сообщение с текстом
                     await self.safe_edit_message_text(
@@ -3270,11 +3627,11 @@ class MarketBot:
                     if enhanced_image_bytes:
                         # Отправляем из байтов
                         from io import BytesIO
-                        await query.message.reply_photo(
+                        await self.send_with_flood_control(
+                            self.application.bot.send_photo,
+                            chat_id=query.message.chat_id,
                             photo=BytesIO(enhanced_image_bytes),
-                            caption=f"🎨 *Улучшенное изображение для {escape_markdown(product_name)}*\n\n"
-                                    f"✨ Профессиональная обработка через Gemini 2.5 Flash Image\n"
-                                    f"📸 Студийное освещение и композиция для B2B продаж",
+                            caption=image_caption,
                             reply_markup=reply_markup,
                             parse_mode='Markdown'
                         )
@@ -3282,11 +3639,11 @@ class MarketBot:
                     elif enhanced_image_path:
                         # Отправляем из локального файла
                         with open(enhanced_image_path, 'rb') as photo_file:
-                            await query.message.reply_photo(
+                            await self.send_with_flood_control(
+                                self.application.bot.send_photo,
+                                chat_id=query.message.chat_id,
                                 photo=photo_file,
-                                caption=f"🎨 *Улучшенное изображение для {escape_markdown(product_name)}*\n\n"
-                                        f"✨ Профессиональная обработка через Gemini 2.5 Flash Image\n"
-                                        f"📸 Студийное освещение и композиция для B2B продаж",
+                                caption=image_caption,
                                 reply_markup=reply_markup,
                                 parse_mode='Markdown'
                             )
@@ -3321,7 +3678,11 @@ class MarketBot:
             except Exception as e2:
                 logger.error(f"Failed to show error message: {e2}")
                 try:
-                    await query.message.reply_text("❌ Ошибка при отображении результата улучшения контента")
+                    await self.send_with_flood_control(
+                        self.application.bot.send_message,
+                        chat_id=query.message.chat_id,
+                        text="❌ Ошибка при отображении результата улучшения контента"
+                    )
                 except Exception as e3:
                     logger.error(f"Failed to send error message: {e3}")
 
@@ -3335,7 +3696,7 @@ class MarketBot:
         user = update.effective_user
         telegram_user_id = user.id
 
-        supplier = self.sheets_manager.get_supplier_by_telegram_id(telegram_user_id)
+        supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, telegram_user_id)
 
         if not supplier:
             await query.edit_message_text(
@@ -3347,7 +3708,7 @@ class MarketBot:
             return
 
         # Получаем все supplier_id для пользователя
-        all_suppliers = self.sheets_manager.get_all_suppliers()
+        all_suppliers = await self._sheets(self.sheets_manager.get_all_suppliers)
         user_supplier_ids = []
 
         for supp_record in all_suppliers:
@@ -3357,7 +3718,7 @@ class MarketBot:
         # Получаем все каналы пользователя
         all_channels = []
         for supp_id in user_supplier_ids:
-            channels = self.sheets_manager.get_channels_by_supplier_id(supp_id)
+            channels = await self._sheets(self.sheets_manager.get_channels_by_supplier_id, supp_id)
             all_channels.extend(channels)
 
         if not all_channels:
@@ -3484,7 +3845,7 @@ class MarketBot:
 
             telegram_user_id = user.id
 
-            supplier = self.sheets_manager.get_supplier_by_telegram_id(telegram_user_id)
+            supplier = await self._sheets(self.sheets_manager.get_supplier_by_telegram_id, telegram_user_id)
 
             if not supplier:
                 await reply_func("❌ Ошибка: вы не зарегистрированы")
@@ -3496,7 +3857,8 @@ class MarketBot:
                 return
 
             # Добавляем канал
-            channel_id = self.sheets_manager.add_channel(
+            channel_id = await self._sheets(
+                self.sheets_manager.add_channel,
                 supplier_internal_id=supplier['internal_id'],
                 channel_username=username,
                 description=description
@@ -3559,7 +3921,7 @@ class MarketBot:
         channel_id = query.data.replace('edit_channel_', '')
 
         # Получаем информацию о канале
-        channel = self.sheets_manager.get_channel_by_id(channel_id)
+        channel = await self._sheets(self.sheets_manager.get_channel_by_id, channel_id)
 
         if not channel:
             await self.safe_edit_message_text(
@@ -3609,7 +3971,8 @@ class MarketBot:
         new_description = update.message.text.strip()
 
         # Обновляем канал
-        success = self.sheets_manager.update_channel(
+        success = await self._sheets(
+            self.sheets_manager.update_channel,
             channel_id=channel_id,
             description=new_description
         )
@@ -3658,7 +4021,7 @@ class MarketBot:
         channel_id = query.data.replace('confirm_delete_channel_', '')
 
         # Удаляем канал
-        success = self.sheets_manager.delete_channel(channel_id)
+        success = await self._sheets(self.sheets_manager.delete_channel, channel_id)
 
         if success:
             await self.safe_edit_message_text(
@@ -3682,5 +4045,12 @@ class MarketBot:
         self.application.run_polling()
 
 if __name__ == '__main__':
+    # uvloop ускоряет цикл событий; без него работаем на стандартном asyncio
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     bot = MarketBot()
     bot.run()
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""
+Ограничение частоты исходящих запросов к Telegram Bot API
+"""
+
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """
+    Асинхронный ограничитель частоты (token bucket)
+
+    Пропускает не более max_rate операций за time_period секунд.
+    Используется как асинхронный контекстный менеджер:
+
+        async with limiter:
+            await bot.send_message(...)
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 1.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = float(max_rate)
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Пополнение токенов пропорционально прошедшему времени"""
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(
+            float(self.max_rate),
+            self._tokens + elapsed * self.max_rate / self.time_period
+        )
+
+    async def acquire(self):
+        """Дождаться свободного токена"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) * self.time_period / self.max_rate
+                await asyncio.sleep(wait_time)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
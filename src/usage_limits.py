@@ -4,13 +4,33 @@
 """
 
 import logging
-from datetime import datetime, date
-from typing import Dict, Any, Optional, List
+import threading
+import time
+from secrets import token_hex
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass
+from collections import Counter
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Конец суток для расчета next_reset
+_END_OF_DAY = datetime.max.time()
+
+# Текущая дата и момент ее смены (timestamp ближайшей полуночи)
+_TODAY = None
+_TODAY_EXPIRES = 0.0
+
+def _today_cached() -> date:
+    """Сегодняшняя дата без создания объекта date на каждый вызов; обновляется сразу после полуночи"""
+    global _TODAY, _TODAY_EXPIRES
+    now = time.time()
+    if now >= _TODAY_EXPIRES:
+        _TODAY = date.fromtimestamp(now)
+        _TODAY_EXPIRES = datetime.combine(_TODAY, _END_OF_DAY).timestamp()
+    return _TODAY
+
+@dataclass(slots=True)
 class UsageRecord:
     """Запись об использовании функции"""
     usage_id: str
@@ -21,7 +41,7 @@ class UsageRecord:
     success: bool
     error_message: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class DailyLimit:
     """Дневные лимиты пользователя"""
     user_id: int
@@ -39,12 +59,25 @@ class UsageLimits:
     DAILY_DESCRIPTION_GENERATION_LIMIT = 1
     DAILY_CONTENT_ENHANCEMENT_LIMIT = 1
 
+    # Лимит и название действия для сообщений по типу действия
+    _ACTION_CONFIG: Dict[str, Tuple[int, str]] = {
+        'image_generation': (DAILY_IMAGE_GENERATION_LIMIT, "генерации изображений"),
+        'description_generation': (DAILY_DESCRIPTION_GENERATION_LIMIT, "генерации описаний"),
+        'content_enhancement': (DAILY_CONTENT_ENHANCEMENT_LIMIT, "улучшения контента"),
+    }
+
+    # Время жизни кеша записей об использовании (секунды)
+    USAGE_CACHE_TTL = 60
+
     def __init__(self, sheets_manager=None):
         """Инициализация сервиса лимитов"""
         self.sheets_manager = sheets_manager
+        self._usage_cache: Dict[Tuple[int, date], Tuple[float, List[dict]]] = {}
+        self._usage_cache_lock = threading.Lock()
         logger.info("Сервис управления лимитами инициализирован")
 
-    def check_daily_limit(self, user_id: int, product_id: str, action_type: str) -> Dict[str, Any]:
+    def check_daily_limit(self, user_id: int, product_id: str, action_type: str,
+                          include_message: bool = True) -> Dict[str, Any]:
         """
         Проверить дневной лимит для пользователя
 
@@ -52,6 +85,7 @@ class UsageLimits:
             user_id: ID пользователя Telegram
             product_id: ID товара
             action_type: Тип действия ('image_generation', 'description_generation', 'content_enhancement')
+            include_message: Формировать текст сообщения для пользователя
 
         Returns:
             Dict: {
@@ -61,28 +95,15 @@ class UsageLimits:
                 'message': str
             }
         """
-        try:
-            # Получаем текущую дату
-            today = datetime.now().date()
-            next_reset = datetime.combine(today, datetime.max.time())
+        # Текущее время читается один раз на всю проверку
+        now = datetime.now()
+        today = now.date()
+        next_reset = datetime.combine(today, _END_OF_DAY)
 
+        try:
             # Проверяем лимит для конкретного действия
-            if action_type == 'image_generation':
-                limit = self.DAILY_IMAGE_GENERATION_LIMIT
-                count = self._get_today_usage_count(user_id, 'image_generation', product_id)
-                action_name = "генерации изображений"
-
-            elif action_type == 'description_generation':
-                limit = self.DAILY_DESCRIPTION_GENERATION_LIMIT
-                count = self._get_today_usage_count(user_id, 'description_generation', product_id)
-                action_name = "генерации описаний"
-
-            elif action_type == 'content_enhancement':
-                limit = self.DAILY_CONTENT_ENHANCEMENT_LIMIT
-                count = self._get_today_usage_count(user_id, 'content_enhancement', product_id)
-                action_name = "улучшения контента"
-
-            else:
+            action_config = self._ACTION_CONFIG.get(action_type)
+            if action_config is None:
                 logger.error(f"Неизвестный тип действия: {action_type}")
                 return {
                     'allowed': False,
@@ -91,40 +112,72 @@ class UsageLimits:
                     'message': "Неизвестный тип действия"
                 }
 
-            remaining = max(0, limit - count)
-
-            result = {
-                'allowed': count < limit,
-                'remaining': remaining,
-                'next_reset': next_reset,
-                'limit': limit,
-                'used': count,
-                'action_name': action_name
-            }
-
-            if not result['allowed']:
-                # Формируем сообщение об исчерпании лимита
-                hours_until_reset = 24 - datetime.now().hour
-                result['message'] = (
-                    f"❌ Лимит на {action_name} исчерпан ({limit} раз в день).\n"
-                    f"Следующее обновление через {hours_until_reset} часов."
-                )
-            else:
-                result['message'] = (
-                    f"✅ Доступно: {remaining}/{limit} {action_name} сегодня."
-                )
-
-            return result
+            count = self._get_today_usage_count(user_id, action_type, product_id, today)
+            return self._build_limit_result(action_type, count, now, next_reset, include_message)
 
         except Exception as e:
             logger.error(f"Ошибка при проверке лимитов: {e}")
             return {
                 'allowed': False,
                 'remaining': 0,
-                'next_reset': datetime.combine(datetime.now().date(), datetime.max.time()),
+                'next_reset': next_reset,
                 'message': "Ошибка при проверке лимитов. Попробуйте позже."
             }
 
+    def check_daily_limit_bulk(self, user_id: int, product_ids: List[str], action_types: List[str],
+                               counts: Counter, include_message: bool = True) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        Проверить дневные лимиты сразу для нескольких товаров и действий без запросов к Sheets
+
+        Args:
+            user_id: ID пользователя Telegram
+            product_ids: ID товаров
+            action_types: Типы действий
+            counts: Счетчики использований за сегодня из _load_today_counts
+            include_message: Формировать текст сообщения для пользователя
+
+        Returns:
+            Dict: {(product_id, action_type): результат как у check_daily_limit}
+        """
+        now = datetime.now()
+        next_reset = datetime.combine(now.date(), _END_OF_DAY)
+        results = {}
+
+        for action_type in action_types:
+            action_config = self._ACTION_CONFIG.get(action_type)
+            if action_config is None:
+                logger.error(f"Неизвестный тип действия: {action_type}")
+                continue
+
+            for product_id in product_ids:
+                results[(product_id, action_type)] = self._build_limit_result(
+                    action_type, counts.get((product_id, action_type), 0), now, next_reset, include_message
+                )
+
+        return results
+
+    def _build_limit_result(self, action_type: str, count: int,
+                            now: datetime, next_reset: datetime,
+                            include_message: bool = True) -> Dict[str, Any]:
+        """Сформировать результат проверки лимита по числу использований за сегодня"""
+        limit, action_name = self._ACTION_CONFIG[action_type]
+
+        result = {
+            'allowed': count < limit,
+            'remaining': max(0, limit - count),
+            'next_reset': next_reset,
+            'limit': limit,
+            'used': count,
+            'action_type': action_type,
+            'action_name': action_name
+        }
+
+        # Текст нужен не всем вызывающим - форматируем только по запросу
+        if include_message:
+            result['message'] = format_limit_message(result, now)
+
+        return result
+
     def record_usage(self, user_id: int, product_id: str, action_type: str,
                      success: bool = True, error_message: str = None) -> bool:
         """
@@ -141,11 +194,9 @@ class UsageLimits:
             bool: Успешность записи
         """
         try:
-            import uuid
-
             # Создаем запись
             usage_record = UsageRecord(
-                usage_id=str(uuid.uuid4()),
+                usage_id=token_hex(16),
                 user_id=user_id,
                 product_id=product_id,
                 action_type=action_type,
@@ -157,6 +208,10 @@ class UsageLimits:
             if self.sheets_manager:
                 # Записываем в Google Sheets
                 self.sheets_manager.add_content_usage(usage_record)
+                # Новая запись должна учитываться при следующей проверке лимита
+                self._invalidate_usage_cache(user_id)
+                if success:
+                    self._consume_token(user_id, product_id, action_type)
                 logger.info(f"Записано использование: {action_type} для пользователя {user_id}")
                 return True
             else:
@@ -167,7 +222,103 @@ class UsageLimits:
             logger.error(f"Ошибка при записи использования: {e}")
             return False
 
-    def _get_today_usage_count(self, user_id: int, action_type: str, product_id: str) -> int:
+    def _refill_tokens(self, bucket: Optional[dict], capacity: int, today: date) -> int:
+        """
+        Текущее число токенов в дневном лимите
+
+        Токены пополняются на capacity за каждые прошедшие сутки (сброс в полночь),
+        поэтому отдельный сброс лимитов не нужен.
+        """
+        if bucket is None:
+            return capacity
+
+        tokens = int(bucket.get('tokens_remaining') or 0)
+        last_refill = date.fromtimestamp(float(bucket.get('last_refill_ts') or 0))
+        elapsed_days = (today - last_refill).days
+        return min(capacity, tokens + elapsed_days * capacity)
+
+    def _consume_token(self, user_id: int, product_id: str, action_type: str):
+        """Списать токен дневного лимита после успешного использования"""
+        action_config = self._ACTION_CONFIG.get(action_type)
+        if action_config is None:
+            return
+
+        capacity = action_config[0]
+        now = datetime.now()
+        bucket = self.sheets_manager.get_daily_limit_bucket(user_id, product_id, action_type)
+        if bucket is None:
+            # Новый bucket заводим по сегодняшним записям content_usage (включая только что
+            # записанную), чтобы использования до появления bucket не давали лишних токенов
+            tokens = capacity - self._count_today_usage(user_id, product_id, action_type)
+        else:
+            tokens = self._refill_tokens(bucket, capacity, now.date()) - 1
+        self.sheets_manager.save_daily_limit_bucket(
+            user_id, product_id, action_type, max(0, tokens), now.timestamp()
+        )
+
+    def _count_today_usage(self, user_id: int, product_id: str, action_type: str) -> int:
+        """Успешные использования товара за сегодня по листу content_usage"""
+        return sum(
+            1 for record in self._get_today_usage_records(user_id)
+            if str(record.get('product_id')) == str(product_id)
+            and record.get('action_type') == action_type
+            and str(record.get('success')).lower() == 'true'
+        )
+
+    def _load_today_counts(self, user_id: int) -> Counter:
+        """
+        Загрузить израсходованные за сегодня токены всех лимитов пользователя одним запросом к Sheets
+
+        Args:
+            user_id: ID пользователя
+
+        Returns:
+            Counter: {(product_id, action_type): количество}
+        """
+        if not self.sheets_manager:
+            return Counter()
+
+        today = _today_cached()
+
+        # Товары без bucket учитываем по сегодняшним записям content_usage
+        counts = Counter(
+            (str(record.get('product_id')), record.get('action_type'))
+            for record in self._get_today_usage_records(user_id)
+            if str(record.get('success')).lower() == 'true'
+        )
+
+        for (product_id, action_type), bucket in self.sheets_manager.get_daily_limit_buckets(user_id).items():
+            action_config = self._ACTION_CONFIG.get(action_type)
+            if action_config is not None:
+                capacity = action_config[0]
+                counts[(product_id, action_type)] = capacity - self._refill_tokens(bucket, capacity, today)
+
+        return counts
+
+    def _get_today_usage_records(self, user_id: int) -> List[dict]:
+        """Записи об использовании за сегодня с кешированием на USAGE_CACHE_TTL секунд"""
+        cache_key = (user_id, _today_cached())
+
+        with self._usage_cache_lock:
+            cached = self._usage_cache.get(cache_key)
+            if cached and time.monotonic() - cached[0] < self.USAGE_CACHE_TTL:
+                return cached[1]
+
+        usage_records = self.sheets_manager.get_content_usage_by_user(user_id, cache_key[1])
+
+        with self._usage_cache_lock:
+            self._usage_cache[cache_key] = (time.monotonic(), usage_records)
+
+        return usage_records
+
+    def _invalidate_usage_cache(self, user_id: int):
+        """Удалить кешированные записи пользователя (включая записи за прошлые дни)"""
+        with self._usage_cache_lock:
+            for cache_key in [key for key in self._usage_cache if key[0] == user_id]:
+                del self._usage_cache[cache_key]
+
+    def _get_today_usage_count(self, user_id: int, action_type: str, product_id: str,
+                               today: Optional[date] = None) -> int:
         """
         Получить количество использований за сегодня
 
@@ -175,26 +326,22 @@ class UsageLimits:
             user_id: ID пользователя
             action_type: Тип действия
             product_id: ID товара (опционально, для проверки лимитов на конкретный товар)
+            today: Текущая дата, если уже известна вызывающему
 
         Returns:
             int: Количество использований
         """
         try:
-            if not self.sheets_manager:
+            action_config = self._ACTION_CONFIG.get(action_type)
+            if not self.sheets_manager or action_config is None:
                 return 0
 
-            today = datetime.now().date()
-            usage_records = self.sheets_manager.get_content_usage_by_user(user_id, today)
-
-            # Фильтруем по типу действия и продукту
-            count = 0
-            for record in usage_records:
-                if (record['action_type'] == action_type and
-                    record['success'] == 'True' and
-                    record['product_id'] == product_id):
-                    count += 1
-
-            return count
+            # Одна запись token bucket вместо просмотра всех использований за день
+            capacity = action_config[0]
+            bucket = self.sheets_manager.get_daily_limit_bucket(user_id, product_id, action_type)
+            if bucket is None:
+                return self._count_today_usage(user_id, product_id, action_type)
+            return capacity - self._refill_tokens(bucket, capacity, today or _today_cached())
 
         except Exception as e:
             logger.error(f"Ошибка при получении счетчика использования: {e}")
@@ -214,16 +361,19 @@ class UsageLimits:
             if not self.sheets_manager:
                 return {}
 
-            today = datetime.now().date()
-            usage_records = self.sheets_manager.get_content_usage_by_user(user_id, today)
+            usage_records = self._get_today_usage_records(user_id)
+
+            # Считаем статистику за сегодня за один проход
+            counts = Counter((record['action_type'], record['success']) for record in usage_records)
+            successful = sum(count for (_, success), count in counts.items() if success == 'True')
 
             stats = {
                 'today': {
-                    'image_generations': 0,
-                    'description_generations': 0,
-                    'content_enhancements': 0,
-                    'successful': 0,
-                    'failed': 0
+                    'image_generations': counts[('image_generation', 'True')],
+                    'description_generations': counts[('description_generation', 'True')],
+                    'content_enhancements': counts[('content_enhancement', 'True')],
+                    'successful': successful,
+                    'failed': len(usage_records) - successful
                 },
                 'total': {
                     'generations': 0,
@@ -231,28 +381,13 @@ class UsageLimits:
                 }
             }
 
-            # Считаем статистику за сегодня
-            for record in usage_records:
-                action_type = record['action_type']
-                success = record['success'] == 'True'
-
-                if success:
-                    stats['today']['successful'] += 1
-                    if action_type == 'image_generation':
-                        stats['today']['image_generations'] += 1
-                    elif action_type == 'description_generation':
-                        stats['today']['description_generations'] += 1
-                    elif action_type == 'content_enhancement':
-                        stats['today']['content_enhancements'] += 1
-                else:
-                    stats['today']['failed'] += 1
-
             # Получаем общую статистику
             all_usage = self.sheets_manager.get_all_content_usage(user_id)
             stats['total']['generations'] = len(all_usage)
 
             if all_usage:
-                last_usage = max(all_usage, key=lambda x: datetime.fromisoformat(x['created_at']))
+                # ISO-строки сравниваются лексикографически так же, как даты
+                last_usage = max(all_usage, key=lambda x: x['created_at'])
                 stats['total']['last_usage'] = last_usage['created_at']
 
             return stats
@@ -263,24 +398,16 @@ class UsageLimits:
 
     def reset_daily_limits(self) -> bool:
         """
-        Сбросить дневные лимиты (вызывать в 00:00 UTC)
+        Сбросить дневные лимиты
+
+        Лимиты хранятся как token bucket и пополняются сами при следующей проверке,
+        поэтому явный сброс больше не требуется.
 
         Returns:
             bool: Успешность сброса
         """
-        try:
-            if self.sheets_manager:
-                # Сбрасываем лимиты в Google Sheets
-                self.sheets_manager.reset_daily_limits(datetime.now().date())
-                logger.info("Дневные лимиты успешно сброшены")
-                return True
-            else:
-                logger.warning("Sheets manager не доступен, сброс лимитов не выполнен")
-                return False
-
-        except Exception as e:
-            logger.error(f"Ошибка при сбросе лимитов: {e}")
-            return False
+        logger.info("Дневные лимиты пополняются автоматически, сброс не требуется")
+        return True
 
     def get_user_products_with_available_generation(self, user_id: int) -> List[Dict[str, Any]]:
         """
@@ -304,24 +431,30 @@ class UsageLimits:
             products = self.sheets_manager.get_products_by_supplier_id(supplier['internal_id'])
             products_with_status = []
 
-            today = datetime.now().date()
-
-            for product in products:
-                product_id = product.get('product_id')
+            # Использования за сегодня загружаются один раз для всех товаров
+            # (ключи счетчиков - строковые product_id, как в листе daily_limits)
+            product_ids = [str(product.get('product_id')) for product in products]
+            limits = self.check_daily_limit_bulk(
+                user_id, product_ids,
+                ['image_generation', 'description_generation', 'content_enhancement'],
+                self._load_today_counts(user_id),
+                include_message=False
+            )
 
-                # Проверяем лимиты для каждого типа действий
-                image_limit = self.check_daily_limit(user_id, product_id, 'image_generation')
-                description_limit = self.check_daily_limit(user_id, product_id, 'description_generation')
-                enhancement_limit = self.check_daily_limit(user_id, product_id, 'content_enhancement')
+            for product, product_id in zip(products, product_ids):
+                # Остаток по каждому типу действий (сообщения здесь не нужны)
+                remaining_image = limits[(product_id, 'image_generation')]['remaining']
+                remaining_description = limits[(product_id, 'description_generation')]['remaining']
+                remaining_enhancement = limits[(product_id, 'content_enhancement')]['remaining']
 
                 products_with_status.append({
                     'product': product,
-                    'can_generate_image': image_limit['allowed'],
-                    'can_generate_description': description_limit['allowed'],
-                    'can_enhance_content': enhancement_limit['allowed'],
-                    'remaining_image': image_limit['remaining'],
-                    'remaining_description': description_limit['remaining'],
-                    'remaining_enhancement': enhancement_limit['remaining']
+                    'can_generate_image': remaining_image > 0,
+                    'can_generate_description': remaining_description > 0,
+                    'can_enhance_content': remaining_enhancement > 0,
+                    'remaining_image': remaining_image,
+                    'remaining_description': remaining_description,
+                    'remaining_enhancement': remaining_enhancement
                 })
 
             return products_with_status
@@ -330,6 +463,10 @@ class UsageLimits:
             logger.error(f"Ошибка при получении товаров с доступной генерацией: {e}")
             return []
 
+    def _is_allowed(self, user_id: int, product_id: str, action_type: str) -> bool:
+        """Только сравнение счетчика с лимитом, без формирования сообщения"""
+        return self._get_today_usage_count(user_id, action_type, product_id) < self._ACTION_CONFIG[action_type][0]
+
     def is_enhancement_available(self, user_id: int, product_id: str) -> bool:
         """
         Проверить, доступно ли улучшение контента для товара
@@ -342,8 +479,7 @@ class UsageLimits:
             bool: Доступность улучшения
         """
         try:
-            limit_check = self.check_daily_limit(user_id, product_id, 'content_enhancement')
-            return limit_check['allowed']
+            return self._is_allowed(user_id, product_id, 'content_enhancement')
 
         except Exception as e:
             logger.error(f"Ошибка при проверке доступности улучшения: {e}")
@@ -361,7 +497,7 @@ class UsageLimits:
         """
         try:
             if self.sheets_manager:
-                cutoff_date = datetime.now().date() - datetime.timedelta(days=days_to_keep)
+                cutoff_date = _today_cached() - timedelta(days=days_to_keep)
                 self.sheets_manager.cleanup_old_usage_records(cutoff_date)
                 logger.info(f"Старые записи об использовании удалены (старше {days_to_keep} дней)")
                 return True
@@ -373,12 +509,47 @@ class UsageLimits:
             logger.error(f"Ошибка при очистке старых записей: {e}")
             return False
 
+def format_limit_message(limit_result: Dict[str, Any], now: Optional[datetime] = None) -> str:
+    """
+    Сформировать текст для пользователя по результату проверки лимита
+
+    Args:
+        limit_result: Результат check_daily_limit
+        now: Текущее время (для расчета часов до обновления)
+
+    Returns:
+        str: Сообщение о доступности или исчерпании лимита
+    """
+    limit = limit_result['limit']
+    action_name = limit_result['action_name']
+
+    if not limit_result['allowed']:
+        # Сообщение об исчерпании лимита
+        hours_until_reset = 24 - (now or datetime.now()).hour
+        return (
+            f"❌ Лимит на {action_name} исчерпан ({limit} раз в день).\n"
+            f"Следующее обновление через {hours_until_reset} часов."
+        )
+
+    return f"✅ Доступно: {limit_result['remaining']}/{limit} {action_name} сегодня."
+
 # Глобальный экземпляр сервиса
 _usage_limits = None
+_usage_limits_lock = threading.Lock()
 
 def get_usage_limits(sheets_manager=None) -> UsageLimits:
     """Получить экземпляр сервиса управления лимитами"""
     global _usage_limits
-    if _usage_limits is None:
-        _usage_limits = UsageLimits(sheets_manager)
-    return _usage_limits
\ No newline at end of file
+    # Быстрый путь без блокировки; блокировка нужна только при первом создании
+    instance = _usage_limits
+    if instance is None:
+        with _usage_limits_lock:
+            instance = _usage_limits
+            if instance is None:
+                instance = UsageLimits(sheets_manager)
+                _usage_limits = instance
+
+    # Экземпляр, созданный без sheets_manager, получает его от следующего вызова
+    if instance.sheets_manager is None and sheets_manager is not None:
+        instance.sheets_manager = sheets_manager
+    return instance
\ No newline at end of file
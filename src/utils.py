@@ -2,6 +2,13 @@
 Утилитарные функции
 """
 
+# Специальные символы в Markdown -> экранированные варианты (одна таблица на модуль)
+_MD_TABLE = str.maketrans({char: '\\' + char for char in '_*[]()~`>#+-=|{}.!'})
+
+# Только символы разметки legacy Markdown (*, _, `) - для пользовательских данных в профиле
+_MD_BASIC_TABLE = str.maketrans({char: '\\' + char for char in '*_`'})
+
+
 def escape_markdown(text: str) -> str:
     """
     Экранирует специальные символы Markdown для Telegram
@@ -15,12 +22,33 @@ def escape_markdown(text: str) -> str:
     if not text:
         return text
 
-    # Специальные символы в Markdown
-    escape_chars = '_*[]()~`>#+-=|{}.!'
+    # Один проход str.translate вместо replace для каждого символа
+    return text.translate(_MD_TABLE)
+
+
+def md_escape(value) -> str:
+    """
+    Экранирует символы разметки Markdown (*, _, `) в пользовательских данных
+    (рынок, павильон, телефоны...)
+
+    Args:
+        value: Значение для экранирования (приводится к строке)
+
+    Returns:
+        str: Экранированный текст
+    """
+    return str(value).translate(_MD_BASIC_TABLE)
 
-    # Создаем экранированный текст
-    escaped = text
-    for char in escape_chars:
-        escaped = escaped.replace(char, '\\' + char)
 
-    return escaped
\ No newline at end of file
+def utf16_len(text: str) -> int:
+    """
+    Длина текста в единицах UTF-16 - так Telegram считает лимиты длины
+    сообщений и подписей (эмодзи вне BMP занимают две единицы)
+
+    Args:
+        text: Текст
+
+    Returns:
+        int: Длина в единицах UTF-16
+    """
+    return len(text.encode('utf-16-le')) // 2
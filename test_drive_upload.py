@@ -6,17 +6,19 @@
 import sys
 sys.path.append('/root/myAI/MarketBot')
 
-from src.image_storage import ImageStorageService
+from src.image_storage import get_image_storage_service, initialize_image_storage
 import asyncio
+import io
+from PIL import Image
 
 async def test_upload():
     """Тест загрузки тестового изображения"""
     print("🧪 Тест загрузки в Google Drive...")
 
     try:
-        # Инициализируем сервис
-        storage = ImageStorageService()
-        initialized = await storage.initialize()
+        # Используем тот же синглтон сервиса, что и бот
+        storage = get_image_storage_service()
+        initialized = await initialize_image_storage()
 
         if not initialized:
             print("❌ Не удалось инициализировать сервис")
@@ -24,20 +26,16 @@ async def test_upload():
 
         print("✅ Сервис инициализирован")
 
-        # Создаем тестовое изображение
-        from PIL import Image
-        import io
-
         # Создаем простое тестовое изображение
         img = Image.new('RGB', (100, 100), color='red')
         img_bytes = io.BytesIO()
         img.save(img_bytes, format='JPEG')
-        img_bytes.seek(0)
+        image_bytes = img_bytes.getvalue()
 
         # Загружаем в Google Drive
         print("📤 Загружаем тестовое изображение...")
         url = await storage.upload_image(
-            image_bytes=img_bytes.getvalue(),
+            image_bytes=image_bytes,
             filename="test_image.jpg",
             product_id="test_product"
         )
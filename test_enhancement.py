@@ -3,16 +3,18 @@
 Скрипт для тестирования улучшения контента
 """
 import asyncio
+import io
 import sys
 import logging
+from PIL import Image
 
 # Устанавливаем PYTHONPATH
 sys.path.insert(0, '/root/myAI/MarketBot')
 
-from src.content_generation_service import ContentGenerationService
+from src.content_generation_service import get_content_generation_service
 from src.gemini_service import GeminiService
 from src.google_sheets import GoogleSheetsManager
-from src.config import GEMINI_API_KEY, GOOGLE_SHEETS_SPREADSHEET_ID
+from src.config import GEMINI_API_KEY
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -21,9 +23,9 @@ logger = logging.getLogger(__name__)
 async def test_enhancement():
     """Тестирование улучшения контента"""
     try:
-        # Инициализация сервисов
-        sheets_manager = GoogleSheetsManager(GOOGLE_SHEETS_SPREADSHEET_ID)
-        content_service = ContentGenerationService(sheets_manager)
+        # Инициализация сервисов (GoogleSheetsManager берет ID таблицы из конфига)
+        sheets_manager = GoogleSheetsManager()
+        content_service = get_content_generation_service(sheets_manager)
 
         # Тестовый товар
         test_product = {
@@ -36,21 +38,17 @@ async def test_enhancement():
         }
 
         # Тестовое изображение (создадим простое для теста)
-        from PIL import Image
-        import io
-
-        # Создаем тестовое изображение
         img = Image.new('RGB', (400, 300), color='lightblue')
         img_bytes = io.BytesIO()
         img.save(img_bytes, format='JPEG')
-        img_bytes.seek(0)
+        image_bytes = img_bytes.getvalue()
 
         # Запускаем улучшение
         logger.info("Начинаем тестирование улучшения контента...")
 
         result = await content_service.enhance_product_content(
             product_info=test_product,
-            product_image_bytes=img_bytes.getvalue(),
+            product_image_bytes=image_bytes,
             generate_image=True,
             generate_description=True,
             generate_marketing=True